@@ -0,0 +1,95 @@
+"""
+Measure the cost of upgrading a legacy (schema version 1) database to the current schema.
+
+    python benchmarks/bench_migration.py --rows 1000000 --batch-size 50000
+
+Generates a version 1 database, then runs database.migrate on it while a second connection
+repeatedly takes the write lock, as another app instance would. Reports total time, per-batch
+transaction times, the longest transaction and the longest time the other writer had to wait,
+plus the file size before and after, as JSON.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+from datagen import generate_database
+
+def probe_writer(db_file, stop, waits, interval=0.01):
+    """Take and release the write lock every `interval` seconds, recording how long each wait took."""
+    conn = sqlite3.connect(db_file, timeout=60, isolation_level=None)
+    while not stop.is_set():
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("COMMIT")
+        waits.append(time.perf_counter() - started)
+        time.sleep(interval)
+    conn.close()
+
+def run(rows, batch_size, workdir):
+    db_file = os.path.join(workdir, f"legacy_{rows}.db")
+    started = time.perf_counter()
+    generate_database(db_file, rows, legacy=True)
+    generate_s = time.perf_counter() - started
+    size_before = os.path.getsize(db_file)
+
+    conn = sqlite3.connect(db_file, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    marks = []
+    stop = threading.Event()
+    waits = []
+    prober = threading.Thread(target=probe_writer, args=(db_file, stop, waits), daemon=True)
+    prober.start()
+    started = time.perf_counter()
+    version = database.migrate(conn, batch_size=batch_size, progress=lambda *_: marks.append(time.perf_counter()))
+    total_s = time.perf_counter() - started
+    stop.set()
+    prober.join()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+
+    # The last mark follows the final swap transaction; the ones before it end a backfill batch.
+    steps = [b - a for a, b in zip([started] + marks, marks)]
+    batches, final_s = steps[:-1], steps[-1] if steps else 0.0
+    return {
+        "rows": rows,
+        "batch_size": batch_size,
+        "schema_version": version,
+        "sqlite_version": sqlite3.sqlite_version,
+        "generate_s": round(generate_s, 3),
+        "migrate_s": round(total_s, 3),
+        "batches": len(batches),
+        "batch_mean_s": round(sum(batches) / len(batches), 4) if batches else None,
+        "batch_max_s": round(max(batches), 4) if batches else None,
+        "final_step_s": round(final_s, 4),
+        "max_writer_wait_s": round(max(waits, default=0.0), 4),
+        "writer_probes": len(waits),
+        "size_before_mb": round(size_before / 1e6, 1),
+        "size_after_mb": round(os.path.getsize(db_file) / 1e6, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=database.MIGRATION_BATCH_SIZE)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        result = run(args.rows, args.batch_size, workdir)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compare memory use and construction time of inventory row representations.
+
+    python benchmarks/bench_models.py --rows 1000000
+
+Measures the original dict-backed dataclass (strptime in __post_init__), the slotted
+lazily-parsed InventoryItem, and the columnar ItemBatch.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import InventoryItem, ItemBatch
+
+@dataclass
+class LegacyInventoryItem:
+    """The pre-slots InventoryItem, kept here as the baseline."""
+    id: Optional[int]
+    name: str
+    quantity: int
+    unit: str
+    expiry_date: datetime
+
+    def __post_init__(self):
+        if isinstance(self.expiry_date, str):
+            self.expiry_date = datetime.strptime(self.expiry_date, "%Y-%m-%d")
+
+def make_rows(count):
+    """Synthetic (id, name, quantity, unit, expiry_date) rows as they come out of SQLite."""
+    start = date(2025, 1, 1)
+    isodates = [(start + timedelta(days=offset)).isoformat() for offset in range(365)]
+    names = ["Milk", "Flour", "Eggs", "Butter", "Tomato", "Rice", "Cheese", "Onion"]
+    return [(row_id, names[row_id % 8], row_id % 500, "g", isodates[row_id % 365]) for row_id in range(1, count + 1)]
+
+def measure(label, build, rows):
+    """Build a representation from rows twice: once timed, once under tracemalloc for memory."""
+    gc.collect()
+    started = time.perf_counter()
+    result = build(rows)
+    elapsed = time.perf_counter() - started
+    del result
+    gc.collect()
+    # tracemalloc slows allocation-heavy code considerably, so memory is measured in a separate pass.
+    tracemalloc.start()
+    result = build(rows)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    gc.collect()
+    return {
+        "label": label,
+        "rows": len(rows),
+        "seconds": round(elapsed, 4),
+        "retained_mb": round(retained / 1e6, 2),
+        "peak_mb": round(peak / 1e6, 2),
+    }
+
+def build_legacy(rows):
+    return [LegacyInventoryItem(id=r[0], name=r[1], quantity=r[2], unit=r[3], expiry_date=r[4]) for r in rows]
+
+def build_items(rows):
+    return [InventoryItem(id=r[0], name=r[1], quantity=r[2], unit=r[3], expiry_date=r[4]) for r in rows]
+
+def build_items_parsed(rows):
+    items = build_items(rows)
+    for item in items:
+        item.expiry_ordinal
+    return items
+
+def build_batch(rows):
+    return ItemBatch.from_rows(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    rows = make_rows(args.rows)
+    results = [
+        measure("legacy_dataclass", build_legacy, rows),
+        measure("inventory_item_lazy", build_items, rows),
+        measure("inventory_item_parsed", build_items_parsed, rows),
+        measure("item_batch", build_batch, rows),
+    ]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
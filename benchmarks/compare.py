@@ -0,0 +1,41 @@
+"""
+Compare two run_benchmarks.py reports and flag regressions.
+
+    python benchmarks/compare.py baseline.json current.json --threshold 0.25
+
+Exits with status 1 if any benchmark's p50 latency grew by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+def load_results(path):
+    with open(path, "r") as f:
+        report = json.load(f)
+    return {(result["name"], result["rows"]): result for result in report["results"]}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative p50 slowdown (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    baseline = load_results(args.baseline)
+    current = load_results(args.current)
+    regressions = 0
+    for key in sorted(current):
+        if key not in baseline:
+            continue
+        before = baseline[key]["p50_ms"]
+        after = current[key]["p50_ms"]
+        change = (after - before) / before if before else 0.0
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{key[0]:<28} rows={key[1]:<8} p50 {before:>10.3f}ms -> {after:>10.3f}ms ({change:+.1%}){flag}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
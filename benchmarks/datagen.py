@@ -0,0 +1,93 @@
+"""
+Generate a synthetic inventory database for benchmarks.
+
+    python benchmarks/datagen.py --rows 100000 --output /tmp/inventory_100k.db
+
+Names and units come from common_ingredients.json. Expiry dates are spread around today:
+most items expire within the next few weeks, some are already expired (a few of them
+stale), and a long tail lasts for months.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import database
+import inventory_service
+
+INGREDIENTS_FILE = os.path.join(REPO_DIR, "common_ingredients.json")
+
+def load_ingredients(path=INGREDIENTS_FILE):
+    """Return a list of (name, default_unit) pairs."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    return [(item["name"], item["default_unit"]) for item in data.get("ingredients", [])]
+
+def expiry_offset(rng):
+    """Days from today until expiry, drawn from a realistic mix."""
+    roll = rng.random()
+    if roll < 0.10:
+        return -rng.randint(8, 30)      # Stale: due for purging
+    if roll < 0.20:
+        return -rng.randint(1, 7)       # Recently expired
+    if roll < 0.75:
+        return rng.randint(0, 21)       # Fresh produce and dairy
+    return rng.randint(22, 365)         # Pantry staples
+
+def generate_rows(count, seed=0, today=None):
+    """Yield (name, quantity, unit, expiry_date) tuples."""
+    rng = random.Random(seed)
+    ingredients = load_ingredients()
+    today = today or date.today()
+    for _ in range(count):
+        name, unit = rng.choice(ingredients)
+        quantity = rng.randint(1, 12) if unit == "pcs" else rng.randint(50, 2000)
+        yield name, quantity, unit, (today + timedelta(days=expiry_offset(rng))).isoformat()
+
+def generate_database(db_file, rows, seed=0, batch_size=50000, legacy=False):
+    """
+    Create db_file (replacing it) with `rows` synthetic items. By default the current schema is
+    used; legacy=True writes the version 1 layout (names and ISO date strings inline) instead,
+    e.g. as input for the migration benchmark.
+    """
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+    conn = sqlite3.connect(db_file)
+    if legacy:
+        database.migrate(conn, target=1)
+        sql = "INSERT INTO inventory (name, quantity, unit, expiry_date) VALUES (?, ?, ?, ?)"
+    else:
+        database.migrate(conn)
+        conn.executemany("INSERT OR IGNORE INTO ingredients (name) VALUES (?)", [(name,) for name, _ in load_ingredients()])
+        sql = inventory_service.INSERT_ITEM_SQL
+    batch = []
+    for name, quantity, unit, expiry in generate_rows(rows, seed):
+        batch.append((name, quantity, unit, expiry if legacy else date.fromisoformat(expiry).toordinal()))
+        if len(batch) >= batch_size:
+            conn.executemany(sql, batch)
+            batch.clear()
+    if batch:
+        conn.executemany(sql, batch)
+    conn.commit()
+    conn.close()
+    return db_file
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic inventory database.")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--legacy", action="store_true", help="Write the version 1 schema instead of the current one")
+    args = parser.parse_args()
+    generate_database(args.output, args.rows, args.seed, legacy=args.legacy)
+    print(f"Wrote {args.rows} items to {args.output}")
+
+if __name__ == "__main__":
+    main()
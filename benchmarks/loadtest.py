@@ -0,0 +1,129 @@
+"""
+Load-test a running server.py instance with many concurrent keep-alive clients.
+
+    python server.py --db /tmp/inventory_100k.db &
+    python benchmarks/loadtest.py --url http://127.0.0.1:8080 --clients 50 --duration 10
+
+Each client loops over a mix of list (with If-None-Match revalidation), search, expiry-report
+and occasional add/delete requests. Reports requests/sec, p50/p99/max latency and status
+counts as JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import urlsplit
+
+class Client:
+    """Minimal HTTP/1.1 keep-alive client over asyncio streams."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=None, headers=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(payload)}"]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload)
+        await self.writer.drain()
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = int(status_line.split(" ")[1])
+        response_headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+        length = int(response_headers.get("content-length", "0"))
+        data = await self.reader.readexactly(length) if length else b""
+        if response_headers.get("connection") == "close":
+            await self.close()
+        return status, response_headers, data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+async def client_loop(client, deadline, latencies, statuses, write_ratio, rng):
+    etags = {}
+    queries = ["mi", "tomato", "oil", "ch", "salt", "egg"]
+    while time.monotonic() < deadline:
+        roll = rng.random()
+        body = None
+        headers = {}
+        if roll < write_ratio / 2:
+            method, path = "POST", "/items"
+            body = {"name": "Load Test Item", "quantity": 1, "unit": "pcs", "expiry_date": "2030-01-01"}
+        elif roll < write_ratio:
+            method, path = "DELETE", "/items"
+            body = {"ids": [rng.randint(1, 1000)]}
+        elif roll < 0.55:
+            method, path = "GET", f"/items?limit=50&offset={rng.choice([0, 50, 100])}"
+        elif roll < 0.80:
+            method, path = "GET", f"/search?q={rng.choice(queries)}&limit=10"
+        else:
+            method, path = "GET", "/expiry-report"
+        if method == "GET" and path in etags:
+            headers["If-None-Match"] = etags[path]
+        started = time.perf_counter()
+        try:
+            status, response_headers, _ = await client.request(method, path, body, headers)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            statuses[type(e).__name__] = statuses.get(type(e).__name__, 0) + 1
+            await client.close()
+            continue
+        latencies.append(time.perf_counter() - started)
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+        if "etag" in response_headers:
+            etags[path] = response_headers["etag"]
+    await client.close()
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))] if ordered else 0.0
+
+async def run(url, clients, duration, write_ratio, seed):
+    parts = urlsplit(url)
+    latencies = []
+    statuses = {}
+    rng = random.Random(seed)
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(*(
+        client_loop(Client(parts.hostname, parts.port or 80), deadline, latencies, statuses, write_ratio,
+                    random.Random(rng.random()))
+        for _ in range(clients)
+    ))
+    elapsed = time.monotonic() - started
+    return {
+        "clients": clients,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "requests_per_sec": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 3),
+        "statuses": statuses,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the headless inventory service.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--write-ratio", type=float, default=0.02, help="Fraction of requests that add/delete items")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    result = asyncio.run(run(args.url, args.clients, args.duration, args.write_ratio, args.seed))
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Headless benchmark suite for the inventory stack.
+
+    python benchmarks/run_benchmarks.py --sizes 10000,100000 --output results.json
+    python benchmarks/compare.py baseline.json results.json
+
+For every inventory size a synthetic database is generated once (see datagen.py) and copied
+into a scratch file before each iteration, so benchmarks that delete rows always start from
+the same data. Each benchmark reports throughput, p50/p99 latency and traced peak memory.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+import expiry
+import inventory_service
+import inventory_store
+import notification_service
+import prompt_builder
+from datagen import generate_database, generate_rows, load_ingredients
+from inventory_view import InventoryViewModel, filter_items
+from models import InventoryItem
+
+BENCHMARKS = []
+
+def benchmark(name, iterations=5, warm_store=False):
+    """
+    Register fn(context) as a benchmark. fn returns either the number of operations it
+    performed (one latency sample per iteration) or a list of per-operation latencies.
+    """
+    def register(fn):
+        BENCHMARKS.append({"name": name, "fn": fn, "iterations": iterations, "warm_store": warm_store})
+        return fn
+    return register
+
+def search_queries():
+    """A fixed mix of short, partial and full-name queries typed into the search bar."""
+    names = [name.lower() for name, _ in load_ingredients()]
+    queries = ["a", "e", "mi", "to", "oil", "salt", "pepper", "chick", "zz"]
+    queries += [name[:4] for name in names[:10]]
+    return queries
+
+# -- Service layer ---------------------------------------------------------------
+
+@benchmark("add_inventory_item", iterations=3)
+def bench_add_inventory_item(context):
+    latencies = []
+    for name, quantity, unit, expiry_date in generate_rows(1000, seed=1):
+        item = InventoryItem(id=None, name=name, quantity=quantity, unit=unit, expiry_date=expiry_date)
+        started = time.perf_counter()
+        inventory_service.add_inventory_item(item)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+@benchmark("add_inventory_items_10k", iterations=3)
+def bench_add_inventory_items(context):
+    items = [InventoryItem(id=None, name=n, quantity=q, unit=u, expiry_date=e) for n, q, u, e in generate_rows(10000, seed=2)]
+    inventory_service.add_inventory_items(items)
+    return len(items)
+
+@benchmark("get_inventory_items")
+def bench_get_inventory_items(context):
+    return len(inventory_service.get_inventory_items())
+
+@benchmark("iter_inventory_items")
+def bench_iter_inventory_items(context):
+    count = 0
+    for _ in inventory_service.iter_inventory_items(batch_size=1000):
+        count += 1
+    return count
+
+@benchmark("store_reload")
+def bench_store_reload(context):
+    store = inventory_store.get_store()
+    store.reload()
+    return len(store)
+
+@benchmark("remove_stale_items", warm_store=True)
+def bench_remove_stale_items(context):
+    notification_service.remove_stale_items()
+    return 1
+
+@benchmark("check_and_notify", warm_store=True)
+def bench_check_and_notify(context):
+    notification_service.check_and_notify()
+    return 1
+
+@benchmark("format_inventory_for_prompt")
+def bench_format_inventory_for_prompt(context):
+    prompt_builder.format_inventory_for_prompt()
+    return 1
+
+@benchmark("expiry_classify", warm_store=True)
+def bench_expiry_classify(context):
+    columns = inventory_store.get_store().expiry_columns()
+    expiry.classify(columns.expiry_ordinals)
+    return 1
+
+@benchmark("expiry_report", warm_store=True)
+def bench_expiry_report(context):
+    expiry.report(inventory_store.get_store().expiry_columns())
+    return 1
+
+# -- GUI search/filter logic (no Tk) ----------------------------------------------
+
+@benchmark("filter_linear", warm_store=True)
+def bench_filter_linear(context):
+    items = inventory_store.get_store().items_sorted_by_expiry()
+    latencies = []
+    for query in search_queries():
+        started = time.perf_counter()
+        filter_items(items, query)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+@benchmark("filter_view_model_indexed", warm_store=True)
+def bench_filter_view_model(context):
+    store = inventory_store.get_store()
+    model = InventoryViewModel(search=store.search_ids)
+    model.set_items(store.items_sorted_by_expiry())
+    latencies = []
+    for query in search_queries():
+        started = time.perf_counter()
+        model.set_query(query)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+# -- Runner -----------------------------------------------------------------------
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def prepare(template, scratch, warm_store):
+    """Reset the scratch database to the template and point the app at it."""
+    database.close_connections()
+    inventory_store.reset_store()
+    for suffix in ("-wal", "-shm"):
+        if os.path.exists(scratch + suffix):
+            os.remove(scratch + suffix)
+    shutil.copyfile(template, scratch)
+    database.set_database_file(scratch)
+    if warm_store:
+        inventory_store.get_store().reload()
+
+def run_benchmark(spec, template, scratch, rows):
+    context = {"rows": rows}
+    latencies = []
+    operations = 0
+    total_time = 0.0
+    for _ in range(spec["iterations"]):
+        prepare(template, scratch, spec["warm_store"])
+        started = time.perf_counter()
+        result = spec["fn"](context)
+        elapsed = time.perf_counter() - started
+        total_time += elapsed
+        if isinstance(result, list):
+            latencies.extend(result)
+            operations += len(result)
+        else:
+            latencies.append(elapsed)
+            operations += result
+    # Peak memory is traced in a separate pass because tracemalloc slows allocation down.
+    prepare(template, scratch, spec["warm_store"])
+    tracemalloc.start()
+    spec["fn"](context)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "name": spec["name"],
+        "rows": rows,
+        "iterations": spec["iterations"],
+        "operations": operations,
+        "throughput_ops_per_sec": round(operations / total_time, 2) if total_time else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 4),
+        "peak_memory_mb": round(peak / 1e6, 3),
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the inventory benchmark suite.")
+    parser.add_argument("--sizes", default="10000", help="Comma-separated inventory sizes, e.g. 10000,100000,1000000")
+    parser.add_argument("--only", default="", help="Comma-separated benchmark names to run (default: all)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    only = {name for name in args.only.split(",") if name}
+    selected = [spec for spec in BENCHMARKS if not only or spec["name"] in only]
+    notification_service.set_notification_callback(lambda message: None)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": [],
+    }
+    workdir = tempfile.mkdtemp(prefix="inventory-bench-")
+    try:
+        for rows in sizes:
+            template = generate_database(os.path.join(workdir, f"template_{rows}.db"), rows)
+            scratch = os.path.join(workdir, "scratch.db")
+            for spec in selected:
+                result = run_benchmark(spec, template, scratch, rows)
+                report["results"].append(result)
+                print(f"{result['name']:<28} rows={rows:<8} p50={result['p50_ms']:>10.3f}ms "
+                      f"p99={result['p99_ms']:>10.3f}ms peak={result['peak_memory_mb']:>8.2f}MB", file=sys.stderr)
+    finally:
+        database.close_connections()
+        inventory_store.reset_store()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
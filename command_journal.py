@@ -0,0 +1,467 @@
+"""
+Undo/redo command journal with write-behind to SQLite.
+
+GUI actions go through a CommandJournal instead of writing to the database directly:
+
+    journal = CommandJournal().start()
+    journal.add_items([item])       # applied to the InventoryStore immediately
+    journal.delete_items([3, 4])
+    journal.undo()
+    journal.redo()
+    journal.submit(fn, *args)       # run fn on the writer thread after pending commands are written
+    journal.close()                 # write everything pending, at exit
+
+Each command is applied to the in-memory store on the caller's thread and handed to a
+background writer, which first appends it to a small write-ahead file next to the database
+(one JSON object per line, fsynced), then, once no command has arrived for `flush_delay`
+seconds or `max_batch` commands are waiting, writes the net effect of every pending command
+in one transaction and drops them from the file. New items take IDs from a block reserved in
+advance, so the caller never waits for the database.
+
+start() replays the commands a crashed run left in the file. Writes are idempotent (rows are
+inserted under their own IDs and existing ones are skipped), so replaying a command that did
+reach the database is harmless.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import database
+import inventory_service
+import metrics
+from inventory_store import get_store
+from models import InventoryItem, item_from_dict
+
+logger = logging.getLogger(__name__)
+
+ADD = "add"
+DELETE = "delete"
+# The write-ahead file is the database path plus this suffix.
+JOURNAL_SUFFIX = ".commands"
+# Seconds without new commands before pending ones are written to the database.
+FLUSH_DELAY = 1.0
+# Write immediately once this many commands are pending.
+MAX_BATCH = 500
+# IDs reserved per round trip; a new block is fetched when fewer than half are left.
+ID_BLOCK = 256
+# Commands kept for undo.
+UNDO_LIMIT = 100
+# Seconds to wait before retrying a failed database write or ID reservation.
+RETRY_SECONDS = 5.0
+
+def _copy(item):
+    return InventoryItem(id=item.id, name=item.name, quantity=item.quantity, unit=item.unit, expiry_date=item.expiry_ordinal)
+
+class Command:
+    """One journaled change: items added (with their assigned IDs) or items deleted (as they were)."""
+    __slots__ = ("kind", "items")
+
+    def __init__(self, kind, items):
+        self.kind = kind
+        self.items = items
+
+    def inverse(self):
+        return Command(DELETE if self.kind == ADD else ADD, self.items)
+
+    def describe(self):
+        """Short description for status messages, e.g. "added Milk" or "deleted 3 items"."""
+        verb = "added" if self.kind == ADD else "deleted"
+        if len(self.items) == 1:
+            return f"{verb} {self.items[0].name}"
+        return f"{verb} {len(self.items)} items"
+
+    def to_json(self):
+        return json.dumps({"op": self.kind, "items": [item.to_dict() for item in self.items]})
+
+    @classmethod
+    def from_json(cls, line):
+        data = json.loads(line)
+        if not isinstance(data, dict) or data.get("op") not in (ADD, DELETE) or not isinstance(data.get("items"), list):
+            raise ValueError("Not a journal command.")
+        items = [item_from_dict(entry) for entry in data["items"]]
+        if any(item.id is None for item in items):
+            raise ValueError("Journaled items must have IDs.")
+        return cls(data["op"], items)
+
+def net_changes(commands):
+    """
+    Collapse commands into (items to insert, IDs to delete). The last command touching an ID
+    decides its fate, so an add that was undone before being written never reaches the database.
+    """
+    final = {}
+    for command in commands:
+        for item in command.items:
+            final[item.id] = item if command.kind == ADD else None
+    added = [item for item in final.values() if item is not None]
+    deleted = [item_id for item_id, item in final.items() if item is None]
+    return added, deleted
+
+def read_journal(path):
+    """Return the commands in the write-ahead file at path; a torn last line is ignored."""
+    commands = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    commands.append(Command.from_json(line))
+                except ValueError as e:
+                    logger.warning("Ignoring journal %s from line %d on: %s", path, number, e)
+                    break
+    except FileNotFoundError:
+        pass
+    return commands
+
+class CommandJournal:
+    """
+    Applies add/delete commands optimistically to an InventoryStore, keeps undo/redo stacks,
+    and writes the commands behind to SQLite from a background thread (see the module docstring).
+    Public methods are meant to be called from one thread (the Tk thread).
+    """
+
+    def __init__(self, store=None, path=None, flush_delay=FLUSH_DELAY, max_batch=MAX_BATCH):
+        self.store = store or get_store()
+        self.path = path or database.DB_FILE + JOURNAL_SUFFIX
+        self.flush_delay = flush_delay
+        self.max_batch = max_batch
+        self._condition = threading.Condition()
+        self._undo = []
+        self._redo = []
+        self._pending = []          # Commands not yet written to the database, oldest first
+        self._unlogged = 0          # How many of the newest pending commands are not yet in the file
+        self._ids = deque()         # Reserved, unused item IDs
+        self._tasks = deque()       # (future, fn, args) to run on the writer thread once pending commands are written
+        self._last_command = 0.0
+        self._retry_at = 0.0
+        self._flush_requested = False
+        self._flush_failures = 0
+        self._stopped = False
+        self._file = None
+        self._thread = None
+        self._unsubscribe = None
+
+    # -- Lifecycle -----------------------------------------------------------
+
+    def start(self):
+        """Replay commands left by a previous run, reserve IDs and start the writer thread."""
+        self._file = open(self.path, "a", encoding="utf-8")
+        self.replay()
+        self._reserve_ids()
+        self._unsubscribe = self.store.subscribe(self._on_store_changed)
+        self._thread = threading.Thread(target=self._run, name="command-journal", daemon=True)
+        self._thread.start()
+        return self
+
+    def replay(self):
+        """Write the commands a previous run journaled but did not write; returns how many there were."""
+        commands = read_journal(self.path)
+        if commands:
+            logger.info("Replaying %d journaled command(s) from %s", len(commands), self.path)
+            metrics.increment("journal.replayed", len(commands))
+            with self._condition:
+                self._pending.extend(commands)
+            self._flush()
+            self._reapply(commands)
+        return len(commands)
+
+    def flush(self, timeout=None):
+        """Write every pending command now and wait for it; returns False on timeout or failure."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._flush_requested = True
+            self._retry_at = 0.0
+            failures = self._flush_failures
+            self._condition.notify_all()
+            while self._pending and self._flush_failures == failures and self._thread is not None and self._thread.is_alive():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return not self._pending
+
+    def submit(self, fn, *args):
+        """
+        Run fn(*args) on the writer thread once every command queued so far is written, for work
+        that reads or writes the database directly (e.g. consuming stock). Returns a Future; it
+        fails with RuntimeError if the pending commands could not be written.
+        """
+        future = Future()
+        with self._condition:
+            if self._stopped:
+                future.set_exception(RuntimeError("The command journal is closed."))
+                return future
+            self._tasks.append((future, fn, args))
+            self._flush_requested = True
+            self._retry_at = 0.0
+            self._condition.notify_all()
+        return future
+
+    def close(self, timeout=None):
+        """Write everything pending and stop the writer; commands it could not write stay in the file."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._unsubscribe:
+            self._unsubscribe()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def pending_count(self):
+        with self._condition:
+            return len(self._pending)
+
+    # -- Commands ------------------------------------------------------------
+
+    def add_items(self, items):
+        """Assign IDs to items, show them in the store and queue them for writing; returns the IDs."""
+        items = list(items)
+        # Reuse the spelling of items already in stock; _flush corrects any other the database keeps.
+        for item in items:
+            item.name = self.store.canonical_name(item.name)
+        for item, item_id in zip(items, self._take_ids(len(items))):
+            item.id = item_id
+        self._record(Command(ADD, [_copy(item) for item in items]))
+        self.store.apply_added(items)
+        return [item.id for item in items]
+
+    def delete_items(self, item_ids):
+        """Remove items from the store and queue the deletion; returns the number of items deleted."""
+        items = [item for item in map(self.store.get, item_ids) if item is not None]
+        if not items:
+            return 0
+        self._record(Command(DELETE, [_copy(item) for item in items]))
+        self.store.apply_deleted([item.id for item in items])
+        return len(items)
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self):
+        """Revert the most recent command; returns it, or None when there is nothing to undo."""
+        if not self._undo:
+            return None
+        command = self._undo.pop()
+        self._apply(command.inverse())
+        self._redo.append(command)
+        return command
+
+    def redo(self):
+        """Re-apply the most recently undone command; returns it, or None when there is nothing to redo."""
+        if not self._redo:
+            return None
+        command = self._redo.pop()
+        self._apply(command)
+        self._undo.append(command)
+        return command
+
+    def _record(self, command):
+        self._undo.append(command)
+        del self._undo[:-UNDO_LIMIT]
+        self._redo.clear()
+        self._enqueue(command)
+
+    def _apply(self, command):
+        # Queue first, so a reload in between (e.g. on the notifier thread) already re-applies it.
+        self._enqueue(command)
+        if command.kind == ADD:
+            self.store.apply_added([_copy(item) for item in command.items])
+        else:
+            self.store.apply_deleted([item.id for item in command.items])
+
+    def _enqueue(self, command):
+        metrics.increment("journal.commands")
+        with self._condition:
+            self._pending.append(command)
+            self._unlogged += 1
+            self._last_command = time.monotonic()
+            self._condition.notify_all()
+
+    def _take_ids(self, count):
+        with self._condition:
+            if len(self._ids) >= count:
+                ids = [self._ids.popleft() for _ in range(count)]
+                self._condition.notify_all()    # The writer tops the block up
+                return ids
+        # Out of reserved IDs (a very large add): reserve what is needed directly.
+        metrics.increment("journal.id_stalls")
+        token = self.store.begin_write()
+        reserved = inventory_service.reserve_item_ids(max(count, ID_BLOCK))
+        if reserved is None:
+            raise RuntimeError("Could not reserve item IDs.")
+        self.store.mark_written(token)
+        reserved = list(reserved)
+        with self._condition:
+            self._ids.extend(reserved[count:])
+        return reserved[:count]
+
+    def _on_store_changed(self, event, payload, version):
+        # A reload shows the database, which lacks the pending commands: apply them again.
+        if event != "reloaded":
+            return
+        with self._condition:
+            pending = list(self._pending)
+        self._reapply(pending)
+
+    def _reapply(self, commands):
+        for command in commands:
+            if command.kind == ADD:
+                self.store.apply_added([_copy(item) for item in command.items])
+            else:
+                self.store.apply_deleted([item.id for item in command.items])
+
+    # -- Writer thread -------------------------------------------------------
+
+    def _needs_ids(self, now):
+        return len(self._ids) < ID_BLOCK // 2 and now >= self._retry_at
+
+    def _flush_due(self, now):
+        if not self._pending:
+            return False
+        if self._stopped:
+            return True
+        if now < self._retry_at:
+            return False
+        return self._flush_requested or len(self._pending) >= self.max_batch or now - self._last_command >= self.flush_delay
+
+    def _wait_timeout(self, now):
+        due = []
+        if self._pending:
+            due.append(max(self._last_command + self.flush_delay, self._retry_at))
+        if len(self._ids) < ID_BLOCK // 2:
+            due.append(self._retry_at)      # A failed reservation is retried even while idle
+        if not due:
+            return None
+        return max(0.0, min(due) - now)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    if self._stopped or self._unlogged or self._flush_due(now) or self._needs_ids(now) or self._tasks_due():
+                        break
+                    self._condition.wait(self._wait_timeout(now))
+                to_log = self._pending[len(self._pending) - self._unlogged:]
+                self._unlogged = 0
+                stopping = self._stopped
+            if to_log:
+                self._append(to_log)
+            with self._condition:
+                now = time.monotonic()
+                flush_due = self._flush_due(now)
+                needs_ids = self._needs_ids(now) and not stopping
+            flushed = self._flush() if flush_due else True
+            if needs_ids:
+                self._reserve_ids()
+            self._run_tasks(flushed)
+            if stopping:
+                with self._condition:
+                    # Commands queued while stopping are logged (and written) on the next pass.
+                    if not self._unlogged:
+                        self._condition.notify_all()
+                        return
+
+    def _tasks_due(self):
+        return bool(self._tasks) and not self._pending
+
+    def _run_tasks(self, flushed):
+        """Run the submitted tasks once nothing is pending; fail them if the flush failed."""
+        with self._condition:
+            if not self._tasks:
+                return
+            if flushed and self._pending:
+                self._flush_requested = True    # Commands queued since: write them first
+                return
+            tasks = list(self._tasks)
+            self._tasks.clear()
+        for future, fn, args in tasks:
+            if not future.set_running_or_notify_cancel():
+                continue
+            if not flushed:
+                future.set_exception(RuntimeError("Could not write pending changes to the database."))
+                continue
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+    def _append(self, commands):
+        try:
+            self._file.write("".join(command.to_json() + "\n" for command in commands))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            logger.error("Error writing command journal: %s", e)
+
+    def _flush(self):
+        """Write the pending commands in one transaction, then drop them from the file."""
+        with self._condition:
+            batch = list(self._pending)
+        if not batch:
+            return True
+        added, deleted = net_changes(batch)
+        names = [item.name for item in added]
+        token = self.store.begin_write()
+        with metrics.timer("journal.flush"):
+            ok = inventory_service.apply_inventory_changes(added, deleted)
+        with self._condition:
+            if ok:
+                del self._pending[:len(batch)]
+                self._flush_requested = False
+                # Only rewrite the commands already in the file; the unlogged ones are appended later.
+                remaining = self._pending[:len(self._pending) - self._unlogged]
+            else:
+                metrics.increment("journal.flush_failures")
+                self._flush_failures += 1
+                self._retry_at = time.monotonic() + RETRY_SECONDS
+                if self._stopped:
+                    self._pending.clear()   # Left in the file for the next start to replay
+            self._condition.notify_all()
+        if ok:
+            self.store.mark_written(token)
+            # apply_inventory_changes gave added items the ingredient's stored spelling.
+            renamed = [_copy(item) for item, name in zip(added, names) if item.name != name]
+            if renamed:
+                self.store.apply_updated(renamed)
+            metrics.increment("journal.flushed", len(batch))
+            self._rewrite(remaining)
+        return ok
+
+    def _rewrite(self, commands):
+        """Replace the file's contents with commands (usually none, which just truncates it)."""
+        try:
+            if not commands:
+                self._file.truncate(0)
+                os.fsync(self._file.fileno())
+                return
+            # Write a new file and rename it over the old one, so a crash leaves one or the other.
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write("".join(command.to_json() + "\n" for command in commands))
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(temp_path, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+        except OSError as e:
+            logger.error("Error writing command journal: %s", e)
+
+    def _reserve_ids(self):
+        token = self.store.begin_write()
+        reserved = inventory_service.reserve_item_ids(ID_BLOCK)
+        with self._condition:
+            if reserved is None:
+                self._retry_at = time.monotonic() + RETRY_SECONDS
+                return
+            self._ids.extend(reserved)
+        self.store.mark_written(token)
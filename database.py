@@ -1,8 +1,34 @@
+import atexit
+import logging
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from sqlite3 import Error
+import metrics
+
+logger = logging.getLogger(__name__)
 
 DB_FILE = "inventory.db"
 
+# Pragmas applied to every pooled connection. WAL lets the GUI thread read while
+# the notification thread writes; NORMAL sync is safe under WAL and avoids an
+# fsync on every commit.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA busy_timeout=5000",
+)
+
+_local = threading.local()          # Per-thread mapping: db_file -> connection
+_pool_lock = threading.Lock()
+_pool = []                          # Every pooled connection, so they can be closed together
+_initialized_files = set()          # Database files whose schema has already been ensured
+_init_locks = {}                    # db_file -> lock held while that file's schema is ensured
+_generation = 0                     # Bumped by close_connections so other threads drop stale handles
+
 def create_connection(db_file=DB_FILE):
     """Create a database connection and ensure the inventory table exists."""
     conn = None
@@ -11,27 +37,505 @@ def create_connection(db_file=DB_FILE):
         create_table_if_not_exists(conn)
         return conn
     except Error as e:
-        print(f"Error connecting to database: {e}")
+        logger.error("Error connecting to database: %s", e)
+        if conn is not None:
+            conn.close()
+    return None
+
+def get_connection(db_file=None):
+    """
+    Return the calling thread's long-lived connection to db_file.
+    Connections are opened once per thread, tuned with CONNECTION_PRAGMAS, and the
+    schema is ensured only the first time a database file is used.
+    """
+    db_file = db_file or DB_FILE
+    connections = getattr(_local, "connections", None)
+    if connections is None or _local.generation != _generation:
+        connections = _local.connections = {}
+        _local.generation = _generation
+    conn = connections.get(db_file)
+    if conn is not None:
+        return conn
+    conn = None
+    try:
+        # InstrumentedConnection times every statement (see metrics.py).
+        conn = sqlite3.connect(db_file, check_same_thread=False, factory=metrics.InstrumentedConnection)
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        # Migrate under a per-file lock, so a long backfill only holds up threads opening
+        # the same file rather than every new connection in the process.
+        with _pool_lock:
+            init_lock = _init_locks.setdefault(db_file, threading.Lock())
+        with init_lock:
+            if db_file not in _initialized_files:
+                create_table_if_not_exists(conn)
+                _initialized_files.add(db_file)
+        with _pool_lock:
+            _pool.append(conn)
+    except Error as e:
+        logger.error("Error connecting to database: %s", e)
+        if conn is not None:
+            conn.close()
+        return None
+    connections[db_file] = conn
     return conn
 
+def close_connections():
+    """Close every pooled connection (all threads) and forget ensured schemas."""
+    global _generation
+    with _pool_lock:
+        _generation += 1
+        for conn in _pool:
+            try:
+                conn.close()
+            except Error:
+                pass
+        _pool.clear()
+        _initialized_files.clear()
+
+def set_database_file(db_file):
+    """Point the connection pool at a different database file (e.g. for tests or benchmarks)."""
+    global DB_FILE
+    close_connections()
+    DB_FILE = db_file
+
+atexit.register(close_connections)
+
+# Schema migrations. Each database records the last migration applied in PRAGMA user_version;
+# migrate() applies the missing ones in order the first time a file is opened.
+SCHEMA_VERSION = 4
+MIGRATION_BATCH_SIZE = 20000        # Rows copied per transaction during online backfills
+MIGRATION_PAUSE = 0.05              # Seconds between backfill batches, so waiting writers get the lock
+# STRICT tables need SQLite 3.37+; older libraries get the same schema without type enforcement.
+STRICT = " STRICT" if sqlite3.sqlite_version_info >= (3, 37, 0) else ""
+# julianday('0001-01-01') - 1, so expiry_day matches Python's date.toordinal().
+JULIAN_ORDINAL_OFFSET = 1721424.5
+
+def get_schema_version(conn):
+    """Return the schema version recorded in the database file."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+@contextmanager
+def write_transaction(conn):
+    """
+    Run a block inside BEGIN IMMEDIATE, committing on success and rolling back on error.
+    Taking the write lock up front keeps other processes from interleaving a migration step.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        yield cursor
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+def migrate(conn, target=SCHEMA_VERSION, batch_size=MIGRATION_BATCH_SIZE, progress=None):
+    """
+    Bring the schema up to version `target`, applying each missing migration in order.
+    progress, if given, is called as progress(version, rows_done, rows_total) during backfills.
+    Every migration re-checks the version under the write lock, so concurrent processes
+    opening the same file apply it only once. Returns the resulting schema version.
+    """
+    version = get_schema_version(conn)
+    for number, migration in MIGRATIONS:
+        if version < number <= target:
+            migration(conn, batch_size, progress)
+            version = get_schema_version(conn)
+    return version
+
 def create_table_if_not_exists(conn):
-    """Create the inventory table with the new unit field if it does not exist."""
+    """Create or upgrade the inventory schema to the current version; migration errors are re-raised."""
     try:
-        sql_create_inventory_table = """
-        CREATE TABLE IF NOT EXISTS inventory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            quantity INTEGER NOT NULL,
-            unit TEXT NOT NULL,
-            expiry_date TEXT NOT NULL
-        );
-        """
-        cursor = conn.cursor()
-        cursor.execute(sql_create_inventory_table)
-        conn.commit()
-        print("Ensured inventory table exists.")
+        version = migrate(conn)
+        logger.debug("Ensured inventory schema (version %s).", version)
     except Error as e:
-        print(f"Error creating table: {e}")
+        logger.error("Error creating table: %s", e)
+        raise
+
+# Version 1: the original flat inventory table with ISO date strings, plus the consumption
+# log and totals maintained by triggers.
+_SCHEMA_V1 = (
+    """
+    CREATE TABLE IF NOT EXISTS inventory (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        unit TEXT NOT NULL,
+        expiry_date TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_inventory_expiry_date ON inventory (expiry_date)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_name ON inventory (name)",
+    """
+    CREATE TABLE IF NOT EXISTS inventory_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        unit TEXT NOT NULL,
+        delta INTEGER NOT NULL,          -- positive for restocks, negative for use/discard
+        kind TEXT NOT NULL,              -- 'restock', 'consume', 'adjust' or 'discard'
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_inventory_events_name ON inventory_events (name, unit)",
+    """
+    CREATE TABLE IF NOT EXISTS ingredient_totals (
+        name TEXT NOT NULL COLLATE NOCASE,
+        unit TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (name, unit)
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_inventory_insert AFTER INSERT ON inventory
+    BEGIN
+        INSERT INTO ingredient_totals (name, unit, quantity) VALUES (NEW.name, NEW.unit, NEW.quantity)
+        ON CONFLICT (name, unit) DO UPDATE SET quantity = quantity + excluded.quantity;
+        INSERT INTO inventory_events (item_id, name, unit, delta, kind)
+        VALUES (NEW.id, NEW.name, NEW.unit, NEW.quantity, 'restock');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_inventory_delete AFTER DELETE ON inventory
+    BEGIN
+        UPDATE ingredient_totals SET quantity = quantity - OLD.quantity
+        WHERE name = OLD.name AND unit = OLD.unit;
+        DELETE FROM ingredient_totals WHERE name = OLD.name AND unit = OLD.unit AND quantity <= 0;
+        INSERT INTO inventory_events (item_id, name, unit, delta, kind)
+        SELECT OLD.id, OLD.name, OLD.unit, -OLD.quantity, 'discard' WHERE OLD.quantity <> 0;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_inventory_update AFTER UPDATE OF name, unit, quantity ON inventory
+    BEGIN
+        UPDATE ingredient_totals SET quantity = quantity - OLD.quantity
+        WHERE name = OLD.name AND unit = OLD.unit;
+        INSERT INTO ingredient_totals (name, unit, quantity) VALUES (NEW.name, NEW.unit, NEW.quantity)
+        ON CONFLICT (name, unit) DO UPDATE SET quantity = quantity + excluded.quantity;
+        DELETE FROM ingredient_totals WHERE name = OLD.name AND unit = OLD.unit AND quantity <= 0;
+        INSERT INTO inventory_events (item_id, name, unit, delta, kind)
+        SELECT NEW.id, NEW.name, NEW.unit, NEW.quantity - OLD.quantity,
+               CASE WHEN NEW.quantity < OLD.quantity THEN 'consume' ELSE 'adjust' END
+        WHERE NEW.quantity <> OLD.quantity;
+    END
+    """,
+)
+
+def _table_exists(cursor, name):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+def _migrate_v1(conn, batch_size, progress):
+    """
+    Baseline schema. Also upgrades files created before the unit column existed, and
+    backfills ingredient_totals when the aggregate is created for existing rows.
+    """
+    with write_transaction(conn) as cursor:
+        if get_schema_version(conn) >= 1:
+            return
+        if _table_exists(cursor, "inventory"):
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(inventory)")}
+            if "unit" not in columns:
+                cursor.execute("ALTER TABLE inventory ADD COLUMN unit TEXT NOT NULL DEFAULT 'pcs'")
+        totals_existed = _table_exists(cursor, "ingredient_totals")
+        for statement in _SCHEMA_V1:
+            cursor.execute(statement)
+        if not totals_existed:
+            cursor.execute("""
+            INSERT INTO ingredient_totals (name, unit, quantity)
+            SELECT name, unit, SUM(quantity) FROM inventory
+            GROUP BY name COLLATE NOCASE, unit HAVING SUM(quantity) > 0
+            """)
+        cursor.execute("PRAGMA user_version = 1")
+
+# Version 2: ingredient names normalized into their own table, expiry stored as an integer day
+# number (date ordinal), STRICT typing and indexes matching the service queries. The new tables
+# are built alongside the old ones under *_v2 names and renamed in the final step.
+_SCHEMA_V2_TABLES = (
+    f"""
+    CREATE TABLE IF NOT EXISTS ingredients (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL COLLATE NOCASE UNIQUE
+    ){STRICT}
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS inventory_v2 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ingredient_id INTEGER NOT NULL REFERENCES ingredients (id),
+        quantity INTEGER NOT NULL,
+        unit TEXT NOT NULL,
+        expiry_day INTEGER NOT NULL      -- date ordinal as in date.toordinal(): 0001-01-01 is day 1
+    ){STRICT}
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_inventory_expiry_day ON inventory_v2 (expiry_day)",
+    "CREATE INDEX IF NOT EXISTS idx_inventory_ingredient ON inventory_v2 (ingredient_id, unit, expiry_day)",
+    f"""
+    CREATE TABLE IF NOT EXISTS inventory_events_v2 (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id INTEGER NOT NULL,
+        ingredient_id INTEGER NOT NULL,
+        unit TEXT NOT NULL,
+        delta INTEGER NOT NULL,          -- positive for restocks, negative for use/discard
+        kind TEXT NOT NULL,              -- 'restock', 'consume', 'adjust' or 'discard'
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    ){STRICT}
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_inventory_events_ingredient ON inventory_events_v2 (ingredient_id, unit)",
+    f"""
+    CREATE TABLE IF NOT EXISTS ingredient_totals_v2 (
+        ingredient_id INTEGER NOT NULL,
+        unit TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (ingredient_id, unit)
+    ){STRICT}
+    """,
+    # Bookkeeping for the backfill; dropped once the migration completes.
+    "CREATE TABLE IF NOT EXISTS schema_migration_state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+)
+
+_SCHEMA_V2_TRIGGERS = (
+    """
+    CREATE TRIGGER trg_inventory_insert AFTER INSERT ON inventory
+    BEGIN
+        INSERT INTO ingredient_totals (ingredient_id, unit, quantity) VALUES (NEW.ingredient_id, NEW.unit, NEW.quantity)
+        ON CONFLICT (ingredient_id, unit) DO UPDATE SET quantity = quantity + excluded.quantity;
+        INSERT INTO inventory_events (item_id, ingredient_id, unit, delta, kind)
+        VALUES (NEW.id, NEW.ingredient_id, NEW.unit, NEW.quantity, 'restock');
+    END
+    """,
+    """
+    CREATE TRIGGER trg_inventory_delete AFTER DELETE ON inventory
+    BEGIN
+        UPDATE ingredient_totals SET quantity = quantity - OLD.quantity
+        WHERE ingredient_id = OLD.ingredient_id AND unit = OLD.unit;
+        DELETE FROM ingredient_totals WHERE ingredient_id = OLD.ingredient_id AND unit = OLD.unit AND quantity <= 0;
+        INSERT INTO inventory_events (item_id, ingredient_id, unit, delta, kind)
+        SELECT OLD.id, OLD.ingredient_id, OLD.unit, -OLD.quantity, 'discard' WHERE OLD.quantity <> 0;
+    END
+    """,
+    """
+    CREATE TRIGGER trg_inventory_update AFTER UPDATE OF ingredient_id, unit, quantity ON inventory
+    BEGIN
+        UPDATE ingredient_totals SET quantity = quantity - OLD.quantity
+        WHERE ingredient_id = OLD.ingredient_id AND unit = OLD.unit;
+        INSERT INTO ingredient_totals (ingredient_id, unit, quantity) VALUES (NEW.ingredient_id, NEW.unit, NEW.quantity)
+        ON CONFLICT (ingredient_id, unit) DO UPDATE SET quantity = quantity + excluded.quantity;
+        DELETE FROM ingredient_totals WHERE ingredient_id = OLD.ingredient_id AND unit = OLD.unit AND quantity <= 0;
+        INSERT INTO inventory_events (item_id, ingredient_id, unit, delta, kind)
+        SELECT NEW.id, NEW.ingredient_id, NEW.unit, NEW.quantity - OLD.quantity,
+               CASE WHEN NEW.quantity < OLD.quantity THEN 'consume' ELSE 'adjust' END
+        WHERE NEW.quantity <> OLD.quantity;
+    END
+    """,
+)
+
+_V2_COPY_ROWS = f"""
+INSERT INTO inventory_v2 (id, ingredient_id, quantity, unit, expiry_day)
+SELECT i.id, g.id, i.quantity, i.unit, CAST(julianday(i.expiry_date) - {JULIAN_ORDINAL_OFFSET} AS INTEGER)
+FROM inventory i JOIN ingredients g ON g.name = i.name
+WHERE {{where}}
+"""
+
+_V2_ADD_TOTALS = """
+INSERT INTO ingredient_totals_v2 (ingredient_id, unit, quantity)
+SELECT ingredient_id, unit, {sign}SUM(quantity) FROM inventory_v2 WHERE {where}
+GROUP BY ingredient_id, unit
+ON CONFLICT (ingredient_id, unit) DO UPDATE SET quantity = quantity + excluded.quantity
+"""
+
+_V2_COPY_EVENTS = """
+INSERT INTO inventory_events_v2 (id, item_id, ingredient_id, unit, delta, kind, created_at)
+SELECT e.id, e.item_id, g.id, e.unit, e.delta, e.kind, e.created_at
+FROM inventory_events e JOIN ingredients g ON g.name = e.name
+WHERE e.id > ? AND e.id <= ?
+"""
+
+def _copy_batch(cursor, table, target_table, batch_size):
+    """
+    Return the (low, high] id range of the next batch_size rows of table not yet copied to
+    target_table, or None when the copy has caught up.
+    """
+    low = cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {target_table}").fetchone()[0]
+    row = cursor.execute(f"SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT 1 OFFSET ?",
+                         (low, batch_size - 1)).fetchone()
+    if row is None:
+        row = cursor.execute(f"SELECT MAX(id) FROM {table} WHERE id > ?", (low,)).fetchone()
+        if row[0] is None:
+            return None
+    return low, row[0]
+
+def _migrate_v2(conn, batch_size, progress):
+    """
+    Normalize names into `ingredients`, store expiry as an integer day and switch to STRICT tables.
+    Rows are backfilled online in batch_size transactions, so readers and writers are only
+    blocked for one batch at a time and an interrupted run resumes where it stopped. Changes
+    made by other connections meanwhile are found through the v1 event log and replayed in
+    the final transaction, which then swaps the tables in.
+    """
+    with write_transaction(conn) as cursor:
+        if get_schema_version(conn) >= 2:
+            return
+        for statement in _SCHEMA_V2_TABLES:
+            cursor.execute(statement)
+        # Every inventory change after this event id is re-applied in the final step.
+        cursor.execute("""
+        INSERT OR IGNORE INTO schema_migration_state (key, value)
+        SELECT 'v2_events_seen', COALESCE(MAX(id), 0) FROM inventory_events
+        """)
+    total = conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+    done = conn.execute("SELECT COUNT(*) FROM inventory_v2").fetchone()[0]
+    while True:
+        with write_transaction(conn) as cursor:
+            if get_schema_version(conn) >= 2:
+                return
+            bounds = _copy_batch(cursor, "inventory", "inventory_v2", batch_size)
+            if bounds is None:
+                break
+            cursor.execute("INSERT OR IGNORE INTO ingredients (name) SELECT DISTINCT name FROM inventory WHERE id > ? AND id <= ?", bounds)
+            cursor.execute(_V2_COPY_ROWS.format(where="i.id > ? AND i.id <= ?"), bounds)
+            done += cursor.rowcount
+            cursor.execute(_V2_ADD_TOTALS.format(sign="", where="id > ? AND id <= ?"), bounds)
+        if progress:
+            progress(2, done, total)
+        time.sleep(MIGRATION_PAUSE)
+    while True:
+        with write_transaction(conn) as cursor:
+            if get_schema_version(conn) >= 2:
+                return
+            bounds = _copy_batch(cursor, "inventory_events", "inventory_events_v2", batch_size)
+            if bounds is None:
+                break
+            cursor.execute("INSERT OR IGNORE INTO ingredients (name) SELECT DISTINCT name FROM inventory_events WHERE id > ? AND id <= ?", bounds)
+            cursor.execute(_V2_COPY_EVENTS, bounds)
+        if progress:
+            progress(2, done, total)
+        time.sleep(MIGRATION_PAUSE)
+    with write_transaction(conn) as cursor:
+        if get_schema_version(conn) >= 2:
+            return
+        # Catch up: rows inserted past the backfill, plus rows changed or deleted since it began.
+        cursor.execute("""
+        CREATE TEMP TABLE v2_changed AS
+        SELECT id FROM inventory WHERE id > (SELECT COALESCE(MAX(id), 0) FROM inventory_v2)
+        UNION
+        SELECT item_id FROM inventory_events
+        WHERE id > (SELECT value FROM schema_migration_state WHERE key = 'v2_events_seen')
+        """)
+        changed = "id IN (SELECT id FROM temp.v2_changed)"
+        cursor.execute(_V2_ADD_TOTALS.format(sign="-", where=changed))
+        cursor.execute(f"DELETE FROM inventory_v2 WHERE {changed}")
+        cursor.execute(f"INSERT OR IGNORE INTO ingredients (name) SELECT DISTINCT name FROM inventory WHERE {changed}")
+        cursor.execute(_V2_COPY_ROWS.format(where=f"i.{changed}"))
+        cursor.execute(_V2_ADD_TOTALS.format(sign="", where=changed))
+        cursor.execute("DELETE FROM ingredient_totals_v2 WHERE quantity <= 0")
+        cursor.execute("DROP TABLE temp.v2_changed")
+        low = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM inventory_events_v2").fetchone()[0]
+        cursor.execute("INSERT OR IGNORE INTO ingredients (name) SELECT DISTINCT name FROM inventory_events WHERE id > ?", (low,))
+        cursor.execute(_V2_COPY_EVENTS, (low, 2 ** 63 - 1))
+        # Swap the new tables in. Indexes move with their tables; AUTOINCREMENT counters are
+        # carried over so ids of deleted rows are never handed out again.
+        for trigger in ("trg_inventory_insert", "trg_inventory_delete", "trg_inventory_update"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        for table in ("inventory", "inventory_events", "ingredient_totals"):
+            if table != "ingredient_totals":
+                cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (f"{table}_v2",))
+                cursor.execute("UPDATE sqlite_sequence SET name = ? WHERE name = ?", (f"{table}_v2", table))
+            cursor.execute(f"DROP TABLE {table}")
+            cursor.execute(f"ALTER TABLE {table}_v2 RENAME TO {table}")
+        for statement in _SCHEMA_V2_TRIGGERS:
+            cursor.execute(statement)
+        cursor.execute("DROP TABLE schema_migration_state")
+        cursor.execute("PRAGMA user_version = 2")
+    if progress:
+        progress(2, total, total)
+
+# Version 3: bookkeeping for the notification worker. sent_alerts records every (item, threshold)
+# alert already delivered so sweeps only report new transitions; leases lets one process at a
+# time hold a named job such as the expiry sweep.
+_SCHEMA_V3 = (
+    f"""
+    CREATE TABLE IF NOT EXISTS sent_alerts (
+        item_id INTEGER NOT NULL,
+        threshold INTEGER NOT NULL,      -- days past expiry, one of NOTIFY_OFFSETS_DAYS
+        sent_at TEXT NOT NULL DEFAULT (datetime('now')),
+        PRIMARY KEY (item_id, threshold)
+    ){STRICT}
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_at REAL NOT NULL         -- Unix time after which another owner may take over
+    ){STRICT}
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_inventory_delete_alerts AFTER DELETE ON inventory
+    BEGIN
+        DELETE FROM sent_alerts WHERE item_id = OLD.id;
+    END
+    """,
+)
+
+def _migrate_v3(conn, batch_size, progress):
+    """Add the sent_alerts and leases tables."""
+    with write_transaction(conn) as cursor:
+        if get_schema_version(conn) >= 3:
+            return
+        for statement in _SCHEMA_V3:
+            cursor.execute(statement)
+        cursor.execute("PRAGMA user_version = 3")
+
+# Version 4: the restock bookkeeping for inserted rows is written once, as set-based statements
+# over a {rows} subquery of (id, ingredient_id, unit, quantity). trg_inventory_insert runs them
+# for NEW; bulk inserts set the guard row and run them once for the whole batch instead.
+BULK_INSERT_GUARD = "bulk_insert"
+RESTOCK_STATEMENTS = (
+    """
+    INSERT INTO ingredient_totals (ingredient_id, unit, quantity)
+    SELECT ingredient_id, unit, SUM(quantity) FROM {rows} WHERE true GROUP BY ingredient_id, unit
+    ON CONFLICT (ingredient_id, unit) DO UPDATE SET quantity = quantity + excluded.quantity
+    """,
+    """
+    INSERT INTO inventory_events (item_id, ingredient_id, unit, delta, kind)
+    SELECT id, ingredient_id, unit, quantity, 'restock' FROM {rows} ORDER BY id
+    """,
+)
+
+def restock_statements(rows):
+    """Return RESTOCK_STATEMENTS for the rows produced by the subquery `rows`."""
+    return [statement.format(rows=rows) for statement in RESTOCK_STATEMENTS]
+
+_NEW_ROW = "(SELECT NEW.id AS id, NEW.ingredient_id AS ingredient_id, NEW.unit AS unit, NEW.quantity AS quantity)"
+
+_SCHEMA_V4 = (
+    f"CREATE TABLE IF NOT EXISTS trigger_guards (name TEXT PRIMARY KEY){STRICT}",
+    "DROP TRIGGER IF EXISTS trg_inventory_insert",
+    f"""
+    CREATE TRIGGER trg_inventory_insert AFTER INSERT ON inventory
+    WHEN NOT EXISTS (SELECT 1 FROM trigger_guards WHERE name = '{BULK_INSERT_GUARD}')
+    BEGIN
+        {";".join(restock_statements(_NEW_ROW))};
+    END
+    """,
+)
+
+def _migrate_v4(conn, batch_size, progress):
+    """Rebuild trg_inventory_insert from RESTOCK_STATEMENTS, guarded for bulk inserts."""
+    with write_transaction(conn) as cursor:
+        if get_schema_version(conn) >= 4:
+            return
+        for statement in _SCHEMA_V4:
+            cursor.execute(statement)
+        cursor.execute("PRAGMA user_version = 4")
+
+# (version, migration) pairs in the order they must be applied.
+MIGRATIONS = (
+    (1, _migrate_v1),
+    (2, _migrate_v2),
+    (3, _migrate_v3),
+    (4, _migrate_v4),
+)
 
 if __name__ == "__main__":
     conn = create_connection()
@@ -0,0 +1,212 @@
+"""
+Expiry classification shared by the GUI, the notifier, the prompt builder and the server.
+
+Items are bucketed by days until expiry (negative once expired):
+
+    EXPIRED  days < 0           red in the GUI
+    TODAY    days == 0          green
+    SOON     1 <= days <= 3     yellow
+    FRESH    days > 3           no highlight
+
+Bulk work runs over an ExpiryColumns snapshot (typed arrays of expiry ordinals, quantities and
+unit codes). With NumPy installed the arrays are wrapped without copying and classified and
+summarized with vector operations; otherwise a pure-Python fallback gives the same results.
+"""
+from array import array
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:     # Optional: the pure-Python fallback is used instead
+    np = None
+
+EXPIRED, TODAY, SOON, FRESH = range(4)
+BUCKETS = ("expired", "today", "soon", "fresh")
+# Treeview colour tag for each bucket ("" for no highlight).
+TAGS = ("red", "green", "yellow", "")
+# Items expiring within this many days (after today) are SOON.
+SOON_DAYS = 3
+# Notifications cover items from this many days before to this many days after expiry.
+NOTIFY_DAYS = 2
+# Weeks ahead covered by report() unless asked otherwise.
+REPORT_WEEKS = 8
+
+def bucket(days):
+    """Return the bucket for an item expiring in `days` days."""
+    if days < 0:
+        return EXPIRED
+    if days == 0:
+        return TODAY
+    if days <= SOON_DAYS:
+        return SOON
+    return FRESH
+
+def in_notify_window(days):
+    """True when an item expiring in `days` days gets an expiry notification."""
+    return -NOTIFY_DAYS <= days <= NOTIFY_DAYS
+
+def _ordinal(today):
+    if today is None:
+        return date.today().toordinal()
+    return today if isinstance(today, int) else today.toordinal()
+
+class ExpiryColumns:
+    """
+    Columnar snapshot of the fields classification needs: expiry ordinals, quantities and unit
+    codes in typed arrays (4/8/2 bytes per row), with `units` mapping codes back to unit names.
+    """
+    __slots__ = ("expiry_ordinals", "quantities", "unit_codes", "units")
+
+    def __init__(self):
+        self.expiry_ordinals = array("i")
+        self.quantities = array("q")
+        self.unit_codes = array("H")
+        self.units = []
+
+    @classmethod
+    def from_items(cls, items):
+        """Build columns from InventoryItem objects (or anything with expiry_ordinal, quantity and unit)."""
+        columns = cls()
+        codes = {}
+        ordinals, quantities, unit_codes, units = columns.expiry_ordinals, columns.quantities, columns.unit_codes, columns.units
+        for item in items:
+            ordinals.append(item.expiry_ordinal)
+            quantities.append(item.quantity)
+            code = codes.get(item.unit)
+            if code is None:
+                code = codes[item.unit] = len(units)
+                units.append(item.unit)
+            unit_codes.append(code)
+        return columns
+
+    @classmethod
+    def from_batch(cls, batch):
+        """Build columns from a models.ItemBatch (the arrays are copied)."""
+        columns = cls()
+        columns.expiry_ordinals = array("i", batch.expiry_ordinals)
+        columns.quantities = array("q", batch.quantities)
+        codes = {}
+        for unit in batch.units:
+            if unit not in codes:
+                codes[unit] = len(codes)
+        columns.units = list(codes)
+        columns.unit_codes = array("H", map(codes.__getitem__, batch.units))
+        return columns
+
+    def __len__(self):
+        return len(self.expiry_ordinals)
+
+def days_until(ordinals, today=None):
+    """Days until expiry for each ordinal: a NumPy int32 array, or an array("i") without NumPy."""
+    today = _ordinal(today)
+    if np is not None:
+        return np.frombuffer(ordinals, dtype=np.intc) - np.intc(today)
+    return array("i", [ordinal - today for ordinal in ordinals])
+
+def classify(ordinals, today=None):
+    """
+    Bucket code (EXPIRED..FRESH) for each expiry ordinal: a NumPy uint8 array, or a bytearray
+    without NumPy. ordinals is any buffer of C ints (e.g. ExpiryColumns.expiry_ordinals).
+    """
+    today = _ordinal(today)
+    if np is not None:
+        days = np.frombuffer(ordinals, dtype=np.intc) - np.intc(today)
+        codes = (days >= 0).view(np.uint8)
+        codes += days >= 1
+        codes += days > SOON_DAYS
+        return codes
+    # Few distinct dates: classify each once and map the rest through a dict in C.
+    lookup = {ordinal: bucket(ordinal - today) for ordinal in set(ordinals)}
+    return bytearray(map(lookup.__getitem__, ordinals))
+
+def count_buckets(ordinals, today=None):
+    """Return {bucket name: item count} for every bucket."""
+    codes = classify(ordinals, today)
+    if np is not None:
+        counts = np.bincount(codes, minlength=len(BUCKETS)).tolist()
+    else:
+        counts = [codes.count(code) for code in range(len(BUCKETS))]
+    return dict(zip(BUCKETS, counts))
+
+def report(columns, today=None, weeks=REPORT_WEEKS):
+    """
+    Summarize an ExpiryColumns snapshot as a JSON-ready dict:
+        buckets  {bucket: item count}
+        units    {unit: {bucket: {"count", "quantity"}}}
+        weeks    one entry per week ahead (week 0 starts today) with its start/end dates,
+                 item count and quantity per unit; items past the last week are in "later".
+    Quantities are only ever summed within a unit.
+    """
+    today = _ordinal(today)
+    units = columns.units
+    nbuckets = len(BUCKETS)
+    span = weeks * 7
+    if np is not None:
+        days = np.frombuffer(columns.expiry_ordinals, dtype=np.intc) - np.intc(today)
+        codes = classify(columns.expiry_ordinals, today)
+        unit_codes = np.frombuffer(columns.unit_codes, dtype=np.ushort).astype(np.intp)
+        quantities = np.frombuffer(columns.quantities, dtype=np.longlong)
+        keys = unit_codes * nbuckets + codes
+        size = len(units) * nbuckets
+        unit_counts = np.bincount(keys, minlength=size).tolist()
+        unit_quantities = np.bincount(keys, weights=quantities, minlength=size).astype(np.int64).tolist()
+        ahead = (days >= 0) & (days < span)
+        week_keys = unit_codes[ahead] * weeks + days[ahead] // 7
+        size = len(units) * weeks
+        week_counts = np.bincount(week_keys, minlength=size).tolist()
+        week_quantities = np.bincount(week_keys, weights=quantities[ahead], minlength=size).astype(np.int64).tolist()
+        later = int(np.count_nonzero(days >= span))
+    else:
+        unit_counts = [0] * (len(units) * nbuckets)
+        unit_quantities = [0] * (len(units) * nbuckets)
+        week_counts = [0] * (len(units) * weeks)
+        week_quantities = [0] * (len(units) * weeks)
+        later = 0
+        lookup = {}
+        for ordinal, quantity, unit_code in zip(columns.expiry_ordinals, columns.quantities, columns.unit_codes):
+            days = ordinal - today
+            code = lookup.get(days)
+            if code is None:
+                code = lookup[days] = bucket(days)
+            key = unit_code * nbuckets + code
+            unit_counts[key] += 1
+            unit_quantities[key] += quantity
+            if 0 <= days < span:
+                key = unit_code * weeks + days // 7
+                week_counts[key] += 1
+                week_quantities[key] += quantity
+            elif days >= span:
+                later += 1
+
+    bucket_counts = dict.fromkeys(BUCKETS, 0)
+    by_unit = {}
+    for unit_index, unit in enumerate(units):
+        entry = by_unit[unit] = {}
+        for code, name in enumerate(BUCKETS):
+            key = unit_index * nbuckets + code
+            entry[name] = {"count": unit_counts[key], "quantity": unit_quantities[key]}
+            bucket_counts[name] += unit_counts[key]
+    week_rows = []
+    for week in range(weeks):
+        quantities = {}
+        count = 0
+        for unit_index, unit in enumerate(units):
+            key = unit_index * weeks + week
+            if week_counts[key]:
+                count += week_counts[key]
+                quantities[unit] = week_quantities[key]
+        week_rows.append({
+            "week": week,
+            "start": date.fromordinal(today + week * 7).isoformat(),
+            "end": date.fromordinal(today + week * 7 + 6).isoformat(),
+            "count": count,
+            "quantities": quantities,
+        })
+    return {
+        "date": date.fromordinal(today).isoformat(),
+        "items": len(columns),
+        "buckets": bucket_counts,
+        "units": by_unit,
+        "weeks": week_rows,
+        "later": later,
+    }
@@ -0,0 +1,354 @@
+"""
+Bulk import and export of inventory items as CSV, JSON or NDJSON.
+
+    python inventory_io.py import receipt.csv [--db inventory.db] [--strict]
+    python inventory_io.py export backup.ndjson [--db inventory.db]
+    python inventory_io.py export - --format json > backup.json
+
+Records have the InventoryItem fields: name, quantity, unit and expiry_date (YYYY-MM-DD); an `id`
+field is ignored on import. A missing unit defaults to the ingredient's default_unit from
+common_ingredients.json. Input is parsed as a stream and inserted in batched transactions, and
+exports stream rows straight from a database cursor, so neither loads a whole file into memory.
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+import database
+import inventory_service
+import metrics
+from models import item_from_dict
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "json", "ndjson")
+FIELDS = ("id", "name", "quantity", "unit", "expiry_date")
+DEFAULT_BATCH_SIZE = 5000
+READ_CHUNK_CHARS = 1 << 16
+MAX_REPORTED_ERRORS = 100
+INGREDIENTS_FILE = os.environ.get(
+    "INGREDIENTS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "common_ingredients.json")
+)
+
+class InvalidRecordError(ValueError):
+    """Raised by a strict import on the first record that fails validation."""
+
+class ImportResult:
+    """Outcome of an import: rows inserted, rows rejected and the first MAX_REPORTED_ERRORS messages."""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []        # (record number, message); records are numbered from 1
+        self.seconds = 0.0
+
+    def add_error(self, number, message, count=1):
+        self.failed += count
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, message))
+
+    def to_dict(self):
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": [{"record": number, "error": message} for number, message in self.errors],
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.imported / self.seconds) if self.seconds else None,
+        }
+
+def detect_format(path, fmt=None):
+    """Return fmt, or the format implied by path's extension (.csv, .json, .ndjson or .jsonl)."""
+    if fmt:
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt}")
+        return fmt
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    if extension == "jsonl":
+        return "ndjson"
+    if extension in FORMATS:
+        return extension
+    raise ValueError(f"Cannot tell the format of {path!r}; pass a format explicitly.")
+
+def load_default_units(path=INGREDIENTS_FILE):
+    """Return {lowercase ingredient name: default unit} from the ingredient catalog."""
+    try:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error("Error loading common ingredients: %s", e)
+        return {}
+    return {item["name"].lower(): item["default_unit"] for item in data.get("ingredients", [])}
+
+# -- Streaming parsers -----------------------------------------------------
+
+def iter_csv_records(f):
+    """Yield one dict per CSV row; the header row names the fields."""
+    return csv.DictReader(f)
+
+def iter_ndjson_records(f):
+    """Yield one decoded value per non-blank line; a malformed line yields a ValueError instead."""
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"invalid JSON: {e}")
+
+class JSONArrayReader:
+    """
+    Incremental reader for a top-level JSON array, or the "items" array of a top-level object
+    (the shape the server returns). Text is read chunk_chars at a time and each element is
+    decoded with JSONDecoder.raw_decode as soon as it is complete, so memory stays bounded by
+    the chunk size and the largest single element.
+    """
+
+    def __init__(self, f, chunk_chars=READ_CHUNK_CHARS):
+        self.f = f
+        self.chunk_chars = chunk_chars
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def __iter__(self):
+        if self._peek() == "{":
+            self._expect("{")
+            while True:
+                key = self._decode()
+                self._expect(":")
+                if key == "items":
+                    break
+                self._decode()          # Skip members before "items"
+                self._expect(",")
+        self._expect("[")
+        if self._peek() == "]":
+            return
+        while True:
+            yield self._decode()
+            if self._expect(",]") == "]":
+                return
+
+    def _fill(self):
+        """Drop consumed text and append the next chunk; returns False at end of input."""
+        chunk = self.f.read(self.chunk_chars)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        self.eof = not chunk
+        return bool(chunk)
+
+    def _peek(self):
+        """Skip whitespace and return the next character without consuming it ("" at end of input)."""
+        while True:
+            buffer, position = self.buffer, self.position
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            self.position = position
+            if position < len(buffer):
+                return buffer[position]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON input, found {char or 'end of input'!r}.")
+        self.position += 1
+        return char
+
+    def _decode(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number that ends exactly at the end of the buffer may continue in the next chunk.
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.position = end
+            return value
+
+def iter_records(f, fmt):
+    """Yield raw records (dicts, or ValueErrors for malformed NDJSON lines) from a text stream."""
+    if fmt == "csv":
+        return iter_csv_records(f)
+    if fmt == "ndjson":
+        return iter_ndjson_records(f)
+    return iter(JSONArrayReader(f))
+
+# -- Import ----------------------------------------------------------------
+
+def record_to_item(record, default_units):
+    """
+    Validate one raw record and return an InventoryItem (without an id).
+    CSV strings are converted, a missing unit is taken from default_units, and every field is
+    then checked by models.item_from_dict; raises ValueError when the record is invalid.
+    """
+    if isinstance(record, ValueError):
+        raise record
+    if not isinstance(record, dict):
+        raise ValueError("Item must be an object.")
+    record.pop("id", None)
+    quantity = record.get("quantity")
+    if isinstance(quantity, str):
+        try:
+            record["quantity"] = int(quantity)
+        except ValueError:
+            raise ValueError("quantity must be an integer.") from None
+    unit = record.get("unit")
+    if unit is None or (isinstance(unit, str) and not unit.strip()):
+        name = record.get("name")
+        default = default_units.get(name.strip().lower()) if isinstance(name, str) else None
+        if default is None:
+            raise ValueError("unit is missing and the ingredient has no default unit.")
+        record["unit"] = default
+    return item_from_dict(record)
+
+def import_records(records, batch_size=DEFAULT_BATCH_SIZE, progress=None, strict=False, default_units=None):
+    """
+    Validate records chunk by chunk and insert each chunk of valid items in one transaction.
+    Inserts run on a writer thread, so the next chunk is parsed and validated while the previous
+    one is written; at most one chunk is in flight. Invalid records are skipped and reported in
+    the result, or raise InvalidRecordError when strict (batches already inserted stay).
+    progress(imported, failed) is called after each batch. Returns an ImportResult.
+    """
+    if default_units is None:
+        default_units = load_default_units()
+    result = ImportResult()
+    started = time.perf_counter()
+    numbered = enumerate(records, 1)
+
+    def collect(pending):
+        first, last, count, future = pending
+        ids = future.result()
+        if ids is None:
+            if strict:
+                raise InvalidRecordError(f"Records {first}-{last}: the batch could not be inserted.")
+            result.add_error(first, f"Batch of {count} records could not be inserted.", count)
+        else:
+            result.imported += len(ids)
+        if progress:
+            progress(result.imported, result.failed)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="import-writer") as writer:
+        pending = None
+        while True:
+            chunk = list(itertools.islice(numbered, batch_size))
+            if not chunk:
+                break
+            items = []
+            for number, record in chunk:
+                try:
+                    items.append(record_to_item(record, default_units))
+                except ValueError as e:
+                    if strict:
+                        raise InvalidRecordError(f"Record {number}: {e}") from None
+                    result.add_error(number, str(e))
+            if pending is not None:
+                collect(pending)
+                pending = None
+            if items:
+                pending = (chunk[0][0], chunk[-1][0], len(items), writer.submit(inventory_service.bulk_add_inventory_items, items))
+            elif progress:
+                progress(result.imported, result.failed)
+        if pending is not None:
+            collect(pending)
+    result.seconds = time.perf_counter() - started
+    metrics.increment("inventory_io.imported", result.imported)
+    metrics.increment("inventory_io.rejected", result.failed)
+    return result
+
+def import_file(path, fmt=None, batch_size=DEFAULT_BATCH_SIZE, progress=None, strict=False):
+    """
+    Import items from a CSV/JSON/NDJSON file ("-" for stdin) and return an ImportResult.
+    Input is read as UTF-8; a leading byte order mark (as Excel writes) is skipped.
+    """
+    fmt = detect_format(path, fmt)
+    if path == "-":
+        stdin = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+        return import_records(iter_records(stdin, fmt), batch_size, progress, strict)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return import_records(iter_records(f, fmt), batch_size, progress, strict)
+
+# -- Export ----------------------------------------------------------------
+
+def export_stream(f, fmt, batch_size=DEFAULT_BATCH_SIZE):
+    """Write every item (ordered by ID) to the text stream f; returns the number of rows written."""
+    iso_dates = {}
+    count = 0
+    rows = inventory_service.iter_inventory_rows(batch_size)
+    writer = csv.writer(f) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(FIELDS)
+    elif fmt == "json":
+        f.write("[")
+    dumps = json.dumps
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        converted = []
+        for row_id, name, quantity, unit, day in batch:
+            expiry = iso_dates.get(day)
+            if expiry is None:
+                expiry = iso_dates[day] = date.fromordinal(day).isoformat()
+            converted.append((row_id, name, quantity, unit, expiry))
+        if writer is not None:
+            writer.writerows(converted)
+        else:
+            lines = [dumps(dict(zip(FIELDS, row))) for row in converted]
+            if fmt == "ndjson":
+                f.write("\n".join(lines) + "\n")
+            else:
+                f.write(("\n" if count == 0 else ",\n") + ",\n".join(lines))
+        count += len(batch)
+    if fmt == "json":
+        f.write("\n]\n" if count else "]\n")
+    metrics.increment("inventory_io.exported", count)
+    return count
+
+def export_file(path, fmt=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Export every item to a CSV/JSON/NDJSON file ("-" for stdout); returns the number of rows written."""
+    fmt = detect_format(path, fmt)
+    if path == "-":
+        return export_stream(sys.stdout, fmt, batch_size)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        return export_stream(f, fmt, batch_size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export inventory items as CSV, JSON or NDJSON.")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path", help='File to read or write; "-" for stdin/stdout (requires --format)')
+    parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+    parser.add_argument("--db", default=database.DB_FILE, help="SQLite database file")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--strict", action="store_true", help="Stop at the first invalid record")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING"), format="%(levelname)s %(name)s: %(message)s")
+    database.set_database_file(args.db)
+    try:
+        if args.command == "import":
+            def report(imported, failed):
+                print(f"\r{imported} imported, {failed} rejected", end="", file=sys.stderr, flush=True)
+            result = import_file(args.path, args.format, args.batch_size, report, args.strict)
+            print(file=sys.stderr)
+            print(json.dumps(result.to_dict(), indent=2))
+        else:
+            count = export_file(args.path, args.format, args.batch_size)
+            print(f"Exported {count} items.", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,505 @@
+import logging
 import sqlite3
+import time
 from datetime import datetime, timedelta
-from database import create_connection
-from models import InventoryItem
+from database import BULK_INSERT_GUARD, get_connection, restock_statements
+from models import InventoryItem, ItemBatch, parse_expiry_ordinal
+from metrics import timed
 
-def add_inventory_item(item: InventoryItem):
-    """Insert a new inventory item into the database, including the unit."""
-    conn = create_connection()
-    sql = """
-    INSERT INTO inventory (name, quantity, unit, expiry_date)
-    VALUES (?, ?, ?, ?)
+logger = logging.getLogger(__name__)
+
+# Items are stored with a normalized ingredient id and the expiry as a day ordinal (see database.py).
+ITEM_SELECT = "SELECT i.id, g.name, i.quantity, i.unit, i.expiry_day FROM inventory i JOIN ingredients g ON g.id = i.ingredient_id"
+INSERT_ITEM_SQL = """
+INSERT INTO inventory (ingredient_id, quantity, unit, expiry_day)
+VALUES ((SELECT id FROM ingredients WHERE name = ?), ?, ?, ?)
+"""
+
+def _ensure_ingredients(cur, names):
     """
+    Add any ingredient names not yet in the ingredients table (case-insensitive).
+    Returns {name: stored name}, since the table keeps the first spelling it saw ("Milk" for "milk").
+    """
+    names = set(names)
+    cur.executemany("INSERT OR IGNORE INTO ingredients (name) VALUES (?)", [(name,) for name in names])
+    return _lookup_ingredients(cur, names)
+
+def _lookup_ingredients(cur, names):
+    canonical = {}
+    for name in names:
+        row = cur.execute("SELECT name FROM ingredients WHERE name = ?", (name,)).fetchone()
+        canonical[name] = row[0] if row else name
+    return canonical
+
+def _canonicalize(items, canonical):
+    for item in items:
+        item.name = canonical.get(item.name, item.name)
+
+@timed("inventory_service.add_inventory_item")
+def add_inventory_item(item: InventoryItem):
+    """Insert a new inventory item into the database, including the unit; item.name becomes the stored spelling."""
+    conn = get_connection()
     try:
-        cur = conn.cursor()
-        cur.execute(sql, (item.name, item.quantity, item.unit, item.expiry_date.strftime("%Y-%m-%d")))
-        conn.commit()
+        with conn:
+            cur = conn.cursor()
+            canonical = _ensure_ingredients(cur, [item.name])
+            cur.execute(INSERT_ITEM_SQL, (item.name, item.quantity, item.unit, item.expiry_ordinal))
+        _canonicalize([item], canonical)
         return cur.lastrowid
     except sqlite3.Error as e:
-        print(f"Error adding item: {e}")
+        logger.error("Error adding item: %s", e)
         return None
-    finally:
-        if conn:
-            conn.close()
 
+@timed("inventory_service.get_inventory_items")
 def get_inventory_items():
     """Retrieve all inventory items from the database."""
-    conn = create_connection()
-    sql = "SELECT id, name, quantity, unit, expiry_date FROM inventory"
-    try:
-        cur = conn.cursor()
-        cur.execute(sql)
-        rows = cur.fetchall()
-        items = []
+    return list(iter_inventory_items(order_by="id"))
+
+# Keyset columns for each supported ordering of iter_inventory_items.
+_KEYSET_ORDERINGS = {
+    "expiry_date": ("i.expiry_day", "i.id"),
+    "id": ("i.id",),
+}
+
+@timed("inventory_service.iter_inventory_items")
+def iter_inventory_items(batch_size=500, where=None, params=(), order_by="expiry_date"):
+    """
+    Lazily yield inventory items, fetching batch_size rows at a time.
+    where is an optional SQL condition (with ? placeholders bound from params).
+    Pages are selected by keyset pagination on (expiry_day, id) or id, so no cursor stays
+    open between batches and only one batch is ever held in memory.
+    """
+    if order_by not in _KEYSET_ORDERINGS:
+        raise ValueError(f"Unsupported ordering: {order_by}")
+    key_columns = _KEYSET_ORDERINGS[order_by]
+    key_sql = ", ".join(key_columns)
+    base_conditions = [f"({where})"] if where else []
+    conn = get_connection()
+    last_key = None
+    while True:
+        conditions = list(base_conditions)
+        page_params = list(params)
+        if last_key is not None:
+            conditions.append(f"({key_sql}) > ({', '.join('?' * len(key_columns))})")
+            page_params.extend(last_key)
+        sql = ITEM_SELECT
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {key_sql} LIMIT ?"
+        page_params.append(batch_size)
+        try:
+            cur = conn.cursor()
+            cur.execute(sql, page_params)
+            rows = cur.fetchmany(batch_size)
+        except sqlite3.Error as e:
+            logger.error("Error fetching items: %s", e)
+            return
         for row in rows:
-            # row: (id, name, quantity, unit, expiry_date)
-            item = InventoryItem(id=row[0], name=row[1], quantity=row[2], unit=row[3], expiry_date=row[4])
-            items.append(item)
-        return items
-    except sqlite3.Error as e:
-        print(f"Error fetching items: {e}")
-        return []
-    finally:
-        if conn:
-            conn.close()
+            yield InventoryItem(id=row[0], name=row[1], quantity=row[2], unit=row[3], expiry_date=row[4])
+        if len(rows) < batch_size:
+            return
+        last_row = rows[-1]
+        last_key = (last_row[4], last_row[0]) if order_by == "expiry_date" else (last_row[0],)
 
+@timed("inventory_service.delete_inventory_item")
 def delete_inventory_item(item_id: int):
     """Delete an inventory item by ID."""
-    conn = create_connection()
+    conn = get_connection()
+    sql = "DELETE FROM inventory WHERE id = ?"
+    try:
+        with conn:
+            cur = conn.cursor()
+            cur.execute(sql, (item_id,))
+        return cur.rowcount
+    except sqlite3.Error as e:
+        logger.error("Error deleting item: %s", e)
+        return None
+
+@timed("inventory_service.add_inventory_items")
+def add_inventory_items(items):
+    """
+    Insert many inventory items in a single transaction.
+    Returns the list of assigned IDs in input order, or None if the batch failed (nothing is inserted).
+    On success each item's name is replaced by the ingredient's stored spelling.
+    """
+    conn = get_connection()
+    items = list(items)
+    rows = [(item.name, item.quantity, item.unit, item.expiry_ordinal) for item in items]
+    if not rows:
+        return []
+    try:
+        with conn:
+            cur = conn.cursor()
+            canonical = _ensure_ingredients(cur, [row[0] for row in rows])
+            cur.executemany(INSERT_ITEM_SQL, rows)
+            # The write lock is held for the whole transaction, so AUTOINCREMENT IDs are consecutive.
+            last_id = cur.execute("SELECT last_insert_rowid()").fetchone()[0]
+        _canonicalize(items, canonical)
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+    except sqlite3.Error as e:
+        logger.error("Error adding items: %s", e)
+        return None
+
+# Bulk inserts stage their rows in a per-connection temp table and move them with one INSERT ... SELECT.
+# The LEFT JOIN makes an unknown ingredient fail the NOT NULL constraint rather than drop the row.
+BULK_STAGING_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS inventory_staging (name TEXT, quantity INTEGER, unit TEXT, expiry_day INTEGER)
+"""
+BULK_INSERT_SQL = """
+INSERT INTO inventory (ingredient_id, quantity, unit, expiry_day)
+SELECT g.id, s.quantity, s.unit, s.expiry_day
+FROM temp.inventory_staging s LEFT JOIN ingredients g ON g.name = s.name
+ORDER BY s.rowid
+"""
+BULK_RESTOCK_SQL = restock_statements(
+    "(SELECT id, ingredient_id, unit, quantity FROM inventory WHERE id BETWEEN ? AND ?)")
+
+@timed("inventory_service.bulk_add_inventory_items")
+def bulk_add_inventory_items(items):
+    """
+    Insert a large batch of items in one transaction, for imports.
+    Rows are staged and moved into inventory with one statement while the trigger guard is set,
+    and the restock events and ingredient totals are then written for the whole batch from the
+    same definition trg_inventory_insert uses (database.RESTOCK_STATEMENTS). The guard row exists
+    only inside this transaction, so other connections' inserts still fire the trigger.
+    Returns the assigned IDs like add_inventory_items, or None if the batch failed.
+    """
+    conn = get_connection()
+    items = list(items)
+    rows = [(item.name, item.quantity, item.unit, item.expiry_ordinal) for item in items]
+    if not rows:
+        return []
+    try:
+        with conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            canonical = _ensure_ingredients(cur, [row[0] for row in rows])
+            cur.execute(BULK_STAGING_SQL)
+            cur.executemany("INSERT INTO temp.inventory_staging VALUES (?, ?, ?, ?)", rows)
+            cur.execute("INSERT INTO trigger_guards (name) VALUES (?)", (BULK_INSERT_GUARD,))
+            cur.execute(BULK_INSERT_SQL)
+            last_id = cur.execute("SELECT last_insert_rowid()").fetchone()[0]
+            first_id = last_id - len(rows) + 1
+            for statement in BULK_RESTOCK_SQL:
+                cur.execute(statement, (first_id, last_id))
+            cur.execute("DELETE FROM trigger_guards WHERE name = ?", (BULK_INSERT_GUARD,))
+            cur.execute("DELETE FROM temp.inventory_staging")
+        _canonicalize(items, canonical)
+        return list(range(first_id, last_id + 1))
+    except sqlite3.Error as e:
+        logger.error("Error adding items: %s", e)
+        return None
+
+@timed("inventory_service.delete_inventory_items")
+def delete_inventory_items(item_ids):
+    """Delete many inventory items by ID in a single transaction; return the number of rows deleted."""
+    conn = get_connection()
     sql = "DELETE FROM inventory WHERE id = ?"
+    params = [(item_id,) for item_id in item_ids]
+    if not params:
+        return 0
+    try:
+        with conn:
+            cur = conn.cursor()
+            cur.executemany(sql, params)
+        return cur.rowcount
+    except sqlite3.Error as e:
+        logger.error("Error deleting items: %s", e)
+        return None
+
+# Insert under an already assigned ID; rows whose ID exists are skipped (no trigger fires for them).
+INSERT_ITEM_WITH_ID_SQL = """
+INSERT OR IGNORE INTO inventory (id, ingredient_id, quantity, unit, expiry_day)
+VALUES (?, (SELECT id FROM ingredients WHERE name = ?), ?, ?, ?)
+"""
+
+@timed("inventory_service.reserve_item_ids")
+def reserve_item_ids(count):
+    """
+    Reserve count item IDs by advancing the inventory AUTOINCREMENT counter, so callers can
+    assign IDs before the rows are written. Returns the reserved range, or None on failure.
+    """
+    conn = get_connection()
+    try:
+        with conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            row = cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'inventory'").fetchone()
+            max_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM inventory").fetchone()[0]
+            last = max(row[0] if row else 0, max_id)
+            if row:
+                cur.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'inventory'", (last + count,))
+            else:
+                cur.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('inventory', ?)", (last + count,))
+        return range(last + 1, last + count + 1)
+    except sqlite3.Error as e:
+        logger.error("Error reserving item IDs: %s", e)
+        return None
+
+@timed("inventory_service.apply_inventory_changes")
+def apply_inventory_changes(added, deleted_ids):
+    """
+    Delete deleted_ids and insert added items under their own IDs in one transaction.
+    Existing IDs are not re-inserted and missing ones are not deleted, so applying the same
+    changes twice is harmless. Returns True on success (added items then carry the stored
+    ingredient names), False if nothing was written.
+    """
+    rows = [(item.id, item.name, item.quantity, item.unit, item.expiry_ordinal) for item in added]
+    params = [(item_id,) for item_id in deleted_ids]
+    if not rows and not params:
+        return True
+    conn = get_connection()
+    try:
+        with conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            if params:
+                cur.executemany("DELETE FROM inventory WHERE id = ?", params)
+            if rows:
+                canonical = _ensure_ingredients(cur, [row[1] for row in rows])
+                cur.executemany(INSERT_ITEM_WITH_ID_SQL, rows)
+                _canonicalize(added, canonical)
+        return True
+    except sqlite3.Error as e:
+        logger.error("Error applying inventory changes: %s", e)
+        return False
+
+def _rows_to_items(rows):
+    """Build InventoryItem objects from (id, name, quantity, unit, expiry_date) rows."""
+    return [InventoryItem(id=row[0], name=row[1], quantity=row[2], unit=row[3], expiry_date=row[4]) for row in rows]
+
+@timed("inventory_service.get_items_expiring_between")
+def get_items_expiring_between(start, end):
+    """Retrieve items whose expiry date lies in [start, end] (dates or datetimes), ordered by expiry."""
+    return list(iter_items_expiring_between(start, end))
+
+def iter_items_expiring_between(start, end, batch_size=500):
+    """Lazily yield items whose expiry date lies in [start, end], ordered by expiry."""
+    return iter_inventory_items(
+        batch_size=batch_size,
+        where="i.expiry_day BETWEEN ? AND ?",
+        params=(parse_expiry_ordinal(start), parse_expiry_ordinal(end)),
+    )
+
+@timed("inventory_service.iter_inventory_rows")
+def iter_inventory_rows(batch_size=5000):
+    """
+    Yield raw (id, name, quantity, unit, expiry_day) tuples ordered by ID from a single cursor,
+    batch_size rows at a time, for bulk consumers such as exports that need no InventoryItem objects.
+    """
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(ITEM_SELECT + " ORDER BY i.id")
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+    except sqlite3.Error as e:
+        logger.error("Error fetching items: %s", e)
+
+@timed("inventory_service.get_items_sorted_by_expiry")
+def get_items_sorted_by_expiry(limit=None, offset=0):
+    """Retrieve items ordered by expiry date (then ID), optionally paginated."""
+    conn = get_connection()
+    sql = ITEM_SELECT + " ORDER BY i.expiry_day, i.id LIMIT ? OFFSET ?"
     try:
         cur = conn.cursor()
-        cur.execute(sql, (item_id,))
-        conn.commit()
+        cur.execute(sql, (-1 if limit is None else limit, offset))
+        return _rows_to_items(cur.fetchall())
+    except sqlite3.Error as e:
+        logger.error("Error fetching items: %s", e)
+        return []
+
+@timed("inventory_service.delete_items_expired_before")
+def delete_items_expired_before(date):
+    """Delete every item whose expiry date is strictly before date; return the number of rows deleted."""
+    conn = get_connection()
+    sql = "DELETE FROM inventory WHERE expiry_day < ?"
+    try:
+        with conn:
+            cur = conn.cursor()
+            cur.execute(sql, (parse_expiry_ordinal(date),))
         return cur.rowcount
     except sqlite3.Error as e:
-        print(f"Error deleting item: {e}")
+        logger.error("Error deleting items: %s", e)
+        return None
+
+@timed("inventory_service.load_item_batch")
+def load_item_batch(where=None, params=(), batch_size=5000):
+    """
+    Load matching rows (ordered by expiry date, then ID) into a columnar ItemBatch
+    without creating an InventoryItem per row.
+    """
+    conn = get_connection()
+    sql = ITEM_SELECT
+    if where:
+        sql += f" WHERE {where}"
+    sql += " ORDER BY i.expiry_day, i.id"
+    batch = ItemBatch()
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            batch.extend_rows(rows)
+    except sqlite3.Error as e:
+        logger.error("Error fetching items: %s", e)
+    return batch
+
+@timed("inventory_service.consume_item")
+def consume_item(name, amount, unit):
+    """
+    Use `amount` of an ingredient, taking it first-in-first-out from the rows that expire earliest.
+    Rows that are used up are deleted; the last row touched is reduced. Runs in one
+    immediate transaction, so concurrent writers cannot consume the same stock twice.
+    Returns a list of (item_id, remaining_quantity) pairs for the rows changed (0 = deleted),
+    or None if there is not enough stock or the update failed.
+    """
+    if amount <= 0:
+        return []
+    conn = get_connection()
+    select_sql = """
+    SELECT id, quantity FROM inventory
+    WHERE ingredient_id = (SELECT id FROM ingredients WHERE name = ?) AND unit = ? AND quantity > 0
+    ORDER BY expiry_day, id
+    """
+    try:
+        with conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute(select_sql, (name, unit))
+            changes = []
+            remaining = amount
+            for item_id, quantity in cur.fetchall():
+                taken = min(quantity, remaining)
+                changes.append((item_id, quantity - taken))
+                remaining -= taken
+                if remaining == 0:
+                    break
+            if remaining > 0:
+                logger.warning("Not enough %s in stock: %s%s available, %s%s requested.", name, amount - remaining, unit, amount, unit)
+                conn.rollback()
+                return None
+            # Reduce before deleting so the consumption is logged as 'consume', not 'discard'.
+            cur.executemany("UPDATE inventory SET quantity = ? WHERE id = ?", [(left, item_id) for item_id, left in changes])
+            cur.executemany("DELETE FROM inventory WHERE id = ? AND quantity = 0", [(item_id,) for item_id, left in changes if left == 0])
+        return changes
+    except sqlite3.Error as e:
+        logger.error("Error consuming item: %s", e)
+        return None
+
+@timed("inventory_service.get_ingredient_total")
+def get_ingredient_total(name, unit):
+    """Return the total quantity in stock for an ingredient and unit (0 if none), from the maintained aggregate."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT t.quantity FROM ingredient_totals t JOIN ingredients g ON g.id = t.ingredient_id "
+            "WHERE g.name = ? AND t.unit = ?",
+            (name, unit),
+        )
+        row = cur.fetchone()
+        return row[0] if row else 0
+    except sqlite3.Error as e:
+        logger.error("Error fetching ingredient total: %s", e)
         return None
-    finally:
-        if conn:
-            conn.close()
+
+@timed("inventory_service.get_ingredient_totals")
+def get_ingredient_totals(name):
+    """Return {unit: quantity} for every unit an ingredient is stocked in."""
+    conn = get_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT t.unit, t.quantity FROM ingredient_totals t JOIN ingredients g ON g.id = t.ingredient_id "
+            "WHERE g.name = ?",
+            (name,),
+        )
+        return dict(cur.fetchall())
+    except sqlite3.Error as e:
+        logger.error("Error fetching ingredient totals: %s", e)
+        return {}
+
+@timed("inventory_service.get_consumption_log")
+def get_consumption_log(name=None, limit=100):
+    """Return the most recent inventory events (newest first) as dicts, optionally for one ingredient."""
+    conn = get_connection()
+    sql = (
+        "SELECT e.id, e.item_id, g.name, e.unit, e.delta, e.kind, e.created_at "
+        "FROM inventory_events e JOIN ingredients g ON g.id = e.ingredient_id"
+    )
+    params = []
+    if name is not None:
+        sql += " WHERE g.name = ?"
+        params.append(name)
+    sql += " ORDER BY e.id DESC LIMIT ?"
+    params.append(limit)
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        columns = ("id", "item_id", "name", "unit", "delta", "kind", "created_at")
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+    except sqlite3.Error as e:
+        logger.error("Error fetching consumption log: %s", e)
+        return []
+
+@timed("inventory_service.acquire_lease")
+def acquire_lease(name, owner, ttl):
+    """
+    Take or renew the named lease for owner for ttl seconds.
+    Returns True if owner now holds it, False if another owner's lease has not yet expired.
+    """
+    conn = get_connection()
+    now = time.time()
+    sql = """
+    INSERT INTO leases (name, owner, expires_at) VALUES (?, ?, ?)
+    ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+    WHERE leases.owner = excluded.owner OR leases.expires_at < ?
+    """
+    try:
+        with conn:
+            cur = conn.cursor()
+            cur.execute(sql, (name, owner, now + ttl, now))
+        return cur.rowcount == 1
+    except sqlite3.Error as e:
+        logger.error("Error acquiring lease: %s", e)
+        return False
+
+@timed("inventory_service.release_lease")
+def release_lease(name, owner):
+    """Give up the named lease if owner still holds it."""
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+    except sqlite3.Error as e:
+        logger.error("Error releasing lease: %s", e)
+
+@timed("inventory_service.claim_alerts")
+def claim_alerts(keys):
+    """
+    Record (item_id, threshold) alerts as sent and return the set of keys that were not already
+    recorded. Runs in one transaction, so concurrent callers never claim the same alert twice.
+    """
+    if not keys:
+        return set()
+    conn = get_connection()
+    sql = "INSERT OR IGNORE INTO sent_alerts (item_id, threshold) VALUES (?, ?)"
+    claimed = set()
+    try:
+        with conn:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            for key in keys:
+                cur.execute(sql, key)
+                if cur.rowcount == 1:
+                    claimed.add(key)
+        return claimed
+    except sqlite3.Error as e:
+        logger.error("Error recording sent alerts: %s", e)
+        return set()
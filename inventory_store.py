@@ -0,0 +1,366 @@
+import logging
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right
+import database
+import expiry
+import inventory_service
+import metrics
+from search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+class InventoryStore:
+    """
+    In-process cache of the inventory table.
+    The table is loaded once; writes go through inventory_service and are then applied to the
+    cache, which keeps secondary indexes by lowercase name and by expiry ordinal. Every change
+    bumps `version` and is published to subscribers as callback(event, payload, version), where
+    event is "added", "updated", "deleted" or "reloaded". Writes made by other processes (or by code that
+    bypasses the store) are detected through PRAGMA data_version and trigger a full reload.
+    """
+
+    def __init__(self, db_file=None, check_interval=1.0):
+        self.db_file = db_file or database.DB_FILE
+        self.check_interval = check_interval    # Seconds between PRAGMA data_version checks
+        self.version = 0
+        self._lock = threading.RLock()
+        self._items = {}          # id -> InventoryItem
+        self._by_name = {}        # lowercase name -> set of ids
+        self._by_expiry = []      # sorted (expiry_ordinal, id) pairs
+        self._search = SearchIndex()  # Substring index over item names
+        self._subscribers = []
+        self._loaded = False
+        self._watch_conn = None   # Dedicated connection, so data_version sees every other writer
+        self._data_version = None
+        self._last_check = 0.0
+        self._columns = None      # (version, expiry.ExpiryColumns) built on demand
+
+    # -- Subscriptions -----------------------------------------------------
+
+    def subscribe(self, callback):
+        """Register callback(event, payload, version); returns a function that unsubscribes it."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def _publish(self, event, payload):
+        self.version += 1
+        version = self.version
+        for callback in list(self._subscribers):
+            try:
+                callback(event, payload, version)
+            except Exception as e:
+                logger.exception("Error in inventory subscriber: %s", e)
+
+    # -- Loading and external change detection -----------------------------
+
+    def reload(self):
+        """Reload the whole table from the database and notify subscribers."""
+        with self._lock, metrics.timer("store.reload"):
+            self._items.clear()
+            self._by_name.clear()
+            self._by_expiry.clear()
+            self._search.clear()
+            # Read the version first, so a commit made while loading triggers another reload.
+            data_version = self._read_data_version()
+            self._index(inventory_service.iter_inventory_items(batch_size=5000, order_by="id"))
+            self._by_expiry.sort()
+            self._loaded = True
+            self._data_version = data_version
+            self._last_check = time.monotonic()
+            self._publish("reloaded", None)
+
+    def refresh_if_changed(self, force_check=False):
+        """Reload if another connection modified the database; returns True if a reload happened."""
+        with self._lock:
+            if not self._loaded:
+                self.reload()
+                return True
+            now = time.monotonic()
+            if not force_check and now - self._last_check < self.check_interval:
+                return False
+            self._last_check = now
+            if self._read_data_version() == self._data_version:
+                return False
+            metrics.increment("store.external_changes")
+            self.reload()
+            return True
+
+    def _read_data_version(self):
+        try:
+            if self._watch_conn is None:
+                self._watch_conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            return self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error("Error checking data version: %s", e)
+            return None
+
+    def _writer_data_version(self):
+        """data_version of the calling thread's connection, which its own commits leave unchanged."""
+        try:
+            return database.get_connection(self.db_file).execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.error("Error checking data version: %s", e)
+            return None
+
+    def _begin_write(self):
+        """
+        Call before writing through the calling thread's connection: catches up with external
+        changes and returns a token for _finish_write.
+        """
+        token = self._writer_data_version()
+        if self._loaded:
+            self.refresh_if_changed(force_check=True)
+        return token
+
+    def _finish_write(self, token):
+        """
+        Call after the write: acknowledges it when no other connection committed since
+        _begin_write (the writer's data_version is unchanged), otherwise reloads.
+        """
+        if not self._loaded:
+            return      # Nothing cached yet; the first read loads everything
+        self._data_version = self._read_data_version()
+        self._last_check = time.monotonic()
+        if token is None or self._writer_data_version() != token:
+            metrics.increment("store.external_changes")
+            self.reload()
+
+    def close(self):
+        with self._lock:
+            if self._watch_conn is not None:
+                self._watch_conn.close()
+                self._watch_conn = None
+
+    # -- Index maintenance -------------------------------------------------
+
+    def _index(self, items):
+        """Add items to the cache; the caller keeps _by_expiry sorted."""
+        items = list(items)
+        for item in items:
+            self._items[item.id] = item
+            self._by_name.setdefault(item.name.lower(), set()).add(item.id)
+            self._by_expiry.append((item.expiry_ordinal, item.id))
+        self._search.add_many((item.id, item.name) for item in items)
+
+    def _unindex(self, item_ids):
+        removed = []
+        for item_id in item_ids:
+            item = self._items.pop(item_id, None)
+            if item is None:
+                continue
+            key = item.name.lower()
+            ids = self._by_name.get(key)
+            if ids is not None:
+                ids.discard(item_id)
+                if not ids:
+                    del self._by_name[key]
+            position = bisect_left(self._by_expiry, (item.expiry_ordinal, item_id))
+            if position < len(self._by_expiry) and self._by_expiry[position] == (item.expiry_ordinal, item_id):
+                del self._by_expiry[position]
+            self._search.remove(item_id)
+            removed.append(item_id)
+        return removed
+
+    # -- Reads -------------------------------------------------------------
+
+    def __len__(self):
+        with self._lock:
+            self.refresh_if_changed()
+            return len(self._items)
+
+    def get(self, item_id):
+        """Return the item with item_id, or None."""
+        with self._lock:
+            self.refresh_if_changed()
+            return self._items.get(item_id)
+
+    def find_by_name(self, name):
+        """Return the items whose name equals name (case-insensitive), ordered by expiry."""
+        with self._lock:
+            self.refresh_if_changed()
+            items = [self._items[item_id] for item_id in self._by_name.get(name.lower(), ())]
+        items.sort(key=lambda item: (item.expiry_ordinal, item.id))
+        return items
+
+    def search_ids(self, query, limit=None):
+        """Return the IDs of items whose name contains query, best matches first."""
+        with self._lock:
+            self.refresh_if_changed()
+            return self._search.search(query, limit)
+
+    def items_sorted_by_expiry(self, offset=0, limit=None):
+        """Return items ordered by expiry date, then ID (optionally one page of them)."""
+        with self._lock:
+            self.refresh_if_changed()
+            entries = self._by_expiry if offset == 0 and limit is None else \
+                self._by_expiry[offset:None if limit is None else offset + limit]
+            return [self._items[item_id] for _, item_id in entries]
+
+    def items_expiring_between(self, start, end):
+        """Return items whose expiry date lies in [start, end] (dates or datetimes), ordered by expiry."""
+        start_ordinal = start.toordinal()
+        end_ordinal = end.toordinal()
+        with self._lock:
+            self.refresh_if_changed()
+            low = bisect_left(self._by_expiry, (start_ordinal,))
+            high = bisect_right(self._by_expiry, (end_ordinal, float("inf")))
+            return [self._items[item_id] for _, item_id in self._by_expiry[low:high]]
+
+    def expiry_columns(self):
+        """Return an expiry.ExpiryColumns snapshot of every item, rebuilt only after the inventory changes."""
+        with self._lock:
+            self.refresh_if_changed()
+            if self._columns is None or self._columns[0] != self.version:
+                self._columns = (self.version, expiry.ExpiryColumns.from_items(self._items.values()))
+            return self._columns[1]
+
+    # -- Writes (through inventory_service) --------------------------------
+
+    def add_item(self, item):
+        """Insert one item; returns its new ID or None on failure."""
+        ids = self.add_items([item])
+        return ids[0] if ids else None
+
+    def add_items(self, items):
+        """Insert items in one transaction; returns their IDs or None on failure."""
+        items = list(items)
+        with self._lock:
+            token = self._begin_write()
+            ids = inventory_service.add_inventory_items(items)
+            if not ids:
+                return ids
+            for item, item_id in zip(items, ids):
+                item.id = item_id
+            self._index(items)
+            self._by_expiry.sort()
+            self._publish("added", items)
+            self._finish_write(token)
+            return ids
+
+    def delete_items(self, item_ids):
+        """Delete items by ID in one transaction; returns the number of rows deleted (None on failure)."""
+        item_ids = list(item_ids)
+        with self._lock:
+            token = self._begin_write()
+            deleted = inventory_service.delete_inventory_items(item_ids)
+            if deleted:
+                removed = self._unindex(item_ids)
+                self._publish("deleted", removed)
+                self._finish_write(token)
+            return deleted
+
+    def consume(self, name, amount, unit):
+        """
+        Use amount of an ingredient FIFO by expiry (see inventory_service.consume_item).
+        Returns the (item_id, remaining_quantity) changes, or None if stock was insufficient.
+        """
+        with self._lock:
+            token = self._begin_write()
+            changes = inventory_service.consume_item(name, amount, unit)
+            if not changes:
+                return changes
+            updated = []
+            for item_id, remaining in changes:
+                item = self._items.get(item_id)
+                if item is not None and remaining > 0:
+                    item.quantity = remaining
+                    updated.append(item)
+            removed = self._unindex([item_id for item_id, remaining in changes if remaining == 0])
+            if updated:
+                self._publish("updated", updated)
+            if removed:
+                self._publish("deleted", removed)
+            self._finish_write(token)
+            return changes
+
+    # -- Optimistic changes (written to the database later, see command_journal) --
+
+    def apply_added(self, items):
+        """Add items that already have IDs to the cache only; IDs already present are skipped."""
+        with self._lock:
+            items = [item for item in items if item.id not in self._items]
+            if items:
+                self._index(items)
+                self._by_expiry.sort()
+                self._publish("added", items)
+            return items
+
+    def apply_deleted(self, item_ids):
+        """Remove items from the cache only; returns the IDs that were present."""
+        with self._lock:
+            removed = self._unindex(item_ids)
+            if removed:
+                self._publish("deleted", removed)
+            return removed
+
+    def apply_updated(self, items):
+        """Replace cached items with these versions of them (same IDs); items not cached are skipped."""
+        with self._lock:
+            items = [item for item in items if item.id in self._items]
+            if items:
+                self._unindex([item.id for item in items])
+                self._index(items)
+                self._by_expiry.sort()
+                self._publish("updated", items)
+            return items
+
+    def canonical_name(self, name):
+        """Return the spelling cached items use for name (case-insensitive), or name itself."""
+        with self._lock:
+            for item_id in self._by_name.get(name.lower(), ()):
+                return self._items[item_id].name
+            return name
+
+    def begin_write(self):
+        """
+        Call before writing on the store's behalf (e.g. command_journal's writer thread), on the
+        thread that writes; returns the token to pass to mark_written.
+        """
+        with self._lock:
+            return self._begin_write()
+
+    def mark_written(self, token):
+        """Acknowledge a write started with begin_write; reloads if another connection also wrote."""
+        with self._lock:
+            self._finish_write(token)
+
+    def purge_expired_before(self, date):
+        """Delete every item expiring strictly before date; returns the number of rows deleted."""
+        with self._lock:
+            token = self._begin_write()
+            deleted = inventory_service.delete_items_expired_before(date)
+            if deleted:
+                high = bisect_left(self._by_expiry, (date.toordinal(),))
+                removed = self._unindex([item_id for _, item_id in self._by_expiry[:high]])
+                self._publish("deleted", removed)
+                self._finish_write(token)
+            return deleted
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Return the shared InventoryStore for the current database file, creating it on first use."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.db_file != database.DB_FILE:
+            if _store is not None:
+                _store.close()
+            _store = InventoryStore()
+        return _store
+
+def reset_store():
+    """Drop the shared store so the next get_store() reloads from the database."""
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        _store = None
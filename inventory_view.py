@@ -0,0 +1,169 @@
+from datetime import datetime
+import expiry
+
+# Columns shown in the inventory Treeview, in display order.
+COLUMNS = ("id", "name", "quantity", "unit", "expiry_date")
+
+def expiry_tag(days_diff):
+    """Return the Treeview colour tag for an item expiring in days_diff days ("" for no highlight)."""
+    return expiry.TAGS[expiry.bucket(days_diff)]
+
+def build_row(item, today_ordinal):
+    """Return the (iid, values, tags) triple used to display an item."""
+    tag = expiry_tag(item.expiry_ordinal - today_ordinal)
+    values = (item.id, item.name, item.quantity, item.unit, item.expiry_iso)
+    return str(item.id), values, ((tag,) if tag else ())
+
+def filter_items(items, query):
+    """Return the items whose name contains query (case-insensitive), preserving order."""
+    query = query.strip().lower()
+    if not query:
+        return list(items)
+    return [item for item in items if query in item.name.lower()]
+
+_SORT_KEYS = {
+    "id": lambda item: item.id,
+    "name": lambda item: item.name.lower(),
+    "quantity": lambda item: item.quantity,
+    "unit": lambda item: item.unit,
+    "expiry_date": lambda item: (item.expiry_ordinal, item.id),
+}
+
+class InventoryViewModel:
+    """
+    Toolkit-independent state behind the inventory table: the loaded items, the active search
+    query and sort order, and the resulting list of rows to display.
+    Without a search callable, queries fall back to a linear substring scan (filter_items).
+    """
+
+    def __init__(self, search=None):
+        self.search = search    # Optional callable: query -> matching item IDs (e.g. a SearchIndex)
+        self.items = []
+        self.query = ""
+        self.sort_column = "expiry_date"
+        self.sort_reverse = False
+        self.rows = []          # Filtered and sorted (iid, values, tags) triples
+        self._today_ordinal = datetime.now().date().toordinal()
+
+    def set_items(self, items):
+        """Replace the loaded items and recompute the visible rows."""
+        self.items = list(items)
+        self._today_ordinal = datetime.now().date().toordinal()
+        self._rebuild()
+
+    def set_query(self, query):
+        """Apply a search query; returns False when the rows did not need recomputing."""
+        query = query.strip().lower()
+        if query == self.query:
+            return False
+        self.query = query
+        self._rebuild()
+        return True
+
+    def sort_by(self, column, reverse=None):
+        """Sort by column; without an explicit direction, clicking the same column toggles it."""
+        if reverse is None:
+            reverse = not self.sort_reverse if column == self.sort_column else False
+        self.sort_column = column
+        self.sort_reverse = reverse
+        self._rebuild()
+
+    def _rebuild(self):
+        if self.query and self.search is not None:
+            matching_ids = set(self.search(self.query))
+            matches = [item for item in self.items if item.id in matching_ids]
+        else:
+            matches = filter_items(self.items, self.query)
+        matches.sort(key=_SORT_KEYS[self.sort_column], reverse=self.sort_reverse)
+        today_ordinal = self._today_ordinal
+        self.rows = [build_row(item, today_ordinal) for item in matches]
+
+class VirtualTreeview:
+    """
+    Renders an InventoryViewModel into a ttk.Treeview, keeping only the rows in the visible
+    window as Treeview items. Each render diffs the window against the rows currently
+    displayed and only inserts, updates, moves or deletes the iids that changed.
+    """
+
+    def __init__(self, tree, scrollbar, model, row_height=25):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.model = model
+        self.row_height = row_height
+        self.top = 0
+        self.window_size = 20
+        self.selected = set()   # Selected iids, kept across rows scrolling out of the window
+        self._displayed = {}    # iid -> (values, tags) currently in the Treeview
+        self._rendering = False
+        scrollbar.configure(command=self.on_scrollbar)
+        tree.bind("<Configure>", self.on_resize)
+        tree.bind("<<TreeviewSelect>>", self.on_select)
+        tree.bind("<MouseWheel>", self.on_mousewheel)
+        tree.bind("<Button-4>", lambda event: self.scroll(-3))
+        tree.bind("<Button-5>", lambda event: self.scroll(3))
+
+    def selection(self):
+        """Return the selected iids, including ones currently scrolled out of view."""
+        return tuple(row[0] for row in self.model.rows if row[0] in self.selected)
+
+    def render(self):
+        """Sync the Treeview with the visible window of the model's rows."""
+        rows = self.model.rows
+        max_top = max(0, len(rows) - self.window_size)
+        self.top = min(self.top, max_top)
+        window = rows[self.top:self.top + self.window_size]
+        wanted = {iid for iid, _, _ in window}
+        tree = self.tree
+        self._rendering = True
+        try:
+            stale = [iid for iid in self._displayed if iid not in wanted]
+            if stale:
+                tree.delete(*stale)
+                for iid in stale:
+                    del self._displayed[iid]
+            for index, (iid, values, tags) in enumerate(window):
+                current = self._displayed.get(iid)
+                if current is None:
+                    tree.insert("", index, iid=iid, values=values, tags=tags)
+                else:
+                    if current != (values, tags):
+                        tree.item(iid, values=values, tags=tags)
+                    if tree.index(iid) != index:
+                        tree.move(iid, "", index)
+                self._displayed[iid] = (values, tags)
+            tree.selection_set([iid for iid in wanted if iid in self.selected])
+        finally:
+            self._rendering = False
+        if rows:
+            self.scrollbar.set(self.top / len(rows), min(1.0, (self.top + self.window_size) / len(rows)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll(self, delta_rows):
+        self.top = max(0, self.top + delta_rows)
+        self.render()
+        return "break"
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.top = max(0, int(float(amount) * len(self.model.rows)))
+            self.render()
+        elif action == "scroll":
+            step = self.window_size if unit == "pages" else 1
+            self.scroll(int(amount) * step)
+
+    def on_mousewheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3)
+
+    def on_resize(self, event):
+        # One row's worth of height is taken by the heading.
+        window_size = max(1, event.height // self.row_height - 1)
+        if window_size != self.window_size:
+            self.window_size = window_size
+            self.render()
+
+    def on_select(self, event):
+        if self._rendering:
+            return
+        visible = set(self._displayed)
+        self.selected = (self.selected - visible) | set(self.tree.selection())
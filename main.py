@@ -1,28 +1,44 @@
 import tkinter as tk
-import threading
+import queue
 import json
-import requests
+import logging
+import os
 from tkinter import ttk, messagebox
 from datetime import datetime, timedelta
 from tkcalendar import DateEntry  # Calendar widget for date selection
+import expiry
+import metrics
+from command_journal import CommandJournal
 from models import InventoryItem
-from inventory_service import add_inventory_item, get_inventory_items, delete_inventory_item
+from inventory_view import COLUMNS, InventoryViewModel, VirtualTreeview
+from prompt_builder import format_inventory_for_prompt
+from recipe_client import CancelEvent, RecipeClient
+from inventory_service import get_ingredient_total
+from inventory_store import get_store
+from search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+# Ingredient catalog used for autocomplete; point INGREDIENTS_FILE at a larger catalog if needed.
+INGREDIENTS_FILE = os.environ.get("INGREDIENTS_FILE", "common_ingredients.json")
+MAX_SUGGESTIONS = 10
 
 # Global variables for autocomplete
 COMMON_INGREDIENTS = {}       # Mapping: ingredient name -> default unit
-common_ingredients_list = []  # List of ingredient names
+common_ingredients_index = SearchIndex()  # Substring index over ingredient names
 
-def load_common_ingredients():
-    """Load common ingredients from a JSON file."""
-    global COMMON_INGREDIENTS, common_ingredients_list
+def load_common_ingredients(path=INGREDIENTS_FILE):
+    """Load common ingredients from a JSON file and index them for autocomplete."""
+    global COMMON_INGREDIENTS
     try:
-        with open("common_ingredients.json", "r") as f:
+        with open(path, "r") as f:
             data = json.load(f)
             ingredients = data.get("ingredients", [])
             COMMON_INGREDIENTS = {item["name"]: item["default_unit"] for item in ingredients}
-            common_ingredients_list = list(COMMON_INGREDIENTS.keys())
+            common_ingredients_index.clear()
+            common_ingredients_index.add_many((name, name) for name in COMMON_INGREDIENTS)
     except Exception as e:
-        print("Error loading common ingredients:", e)
+        logger.error("Error loading common ingredients: %s", e)
 
 def update_suggestions(event):
     """Update the suggestion Listbox based on text typed in the item name entry."""
@@ -31,14 +47,13 @@ def update_suggestions(event):
     if text == "":
         suggestion_box.place_forget()
         return
-    matches = [item for item in common_ingredients_list if text in item.lower()]
+    matches = common_ingredients_index.search(text, limit=MAX_SUGGESTIONS)
     if matches:
         suggestion_box.config(height=len(matches))
         x = entry_name.winfo_x()
         y = entry_name.winfo_y() + entry_name.winfo_height()
         suggestion_box.place(x=x, y=y, width=entry_name.winfo_width())
-        for match in matches:
-            suggestion_box.insert(tk.END, match)
+        suggestion_box.insert(tk.END, *matches)
     else:
         suggestion_box.place_forget()
 
@@ -80,201 +95,291 @@ def add_item():
         return
     
     item = InventoryItem(id=None, name=name, quantity=quantity, unit=unit, expiry_date=expiry_date)
-    item_id = add_inventory_item(item)
-    if item_id:
-        messagebox.showinfo("Success", f"Item added with ID: {item_id}")
-        refresh_inventory()
-    else:
-        messagebox.showerror("Error", "Failed to add item.")
+    try:
+        item_id = journal.add_items([item])[0]
+    except RuntimeError as e:
+        messagebox.showerror("Error", f"Failed to add item: {e}")
+        return
+    set_status(f"Added {name} with ID {item_id}. Press Ctrl+Z to undo.")
+
+def use_item():
+    """Consume the entered quantity of an ingredient, taking it from the earliest-expiring rows first."""
+    name = entry_name.get().strip()
+    quantity_str = entry_quantity.get().strip()
+    unit = unit_combobox.get().strip()
+    if not name or not quantity_str or not unit:
+        messagebox.showerror("Error", "Please enter the item name, quantity and unit to use.")
+        return
+    try:
+        amount = int(quantity_str)
+    except ValueError:
+        messagebox.showerror("Error", "Quantity must be an integer.")
+        return
+    if amount <= 0:
+        messagebox.showerror("Error", "Quantity must be positive.")
+        return
+
+    def consume():
+        # Runs on the journal's writer thread, after the pending adds and deletes are written.
+        return get_store().consume(name, amount, unit), get_ingredient_total(name, unit) or 0
+
+    set_status(f"Using {amount}{unit} of {name}...")
+    journal.submit(consume).add_done_callback(lambda future: root.after(0, report_use, future, name, amount, unit))
+
+def report_use(future, name, amount, unit):
+    """Show the outcome of use_item once the writer thread has finished it."""
+    try:
+        changes, remaining = future.result()
+    except Exception as e:
+        set_status(f"Failed to use {name}: {e}")
+        return
+    if changes is None:
+        set_status(f"Not enough {name} in stock ({remaining}{unit} available).")
+        return
+    set_status(f"Used {amount}{unit} of {name}; {remaining}{unit} left.")
 
 def refresh_inventory():
-    """Remove stale items, auto-sort by expiry date, and populate the Treeview with color-coded rows."""
+    """Remove stale items and reload the inventory from the database; the Treeview re-renders when the store reloads."""
     # Import remove_stale_items locally to avoid circular dependencies.
     from notification_service import remove_stale_items
-    remove_stale_items()
-    for i in tree.get_children():
-        tree.delete(i)
-    items = sorted(get_inventory_items(), key=lambda item: item.expiry_date)
-    today = datetime.now().date()
-    for item in items:
-        expiry_date = item.expiry_date.date()
-        days_diff = (expiry_date - today).days
-        tag = ""
-        if days_diff < 0:
-            tag = "red"      # Expired items
-        elif days_diff == 0:
-            tag = "green"    # Expires today
-        elif 0 < days_diff <= 3:
-            tag = "yellow"   # Expires within 3 days
-        if tag:
-            tree.insert("", "end", iid=item.id, values=(
-                item.id, item.name, item.quantity, item.unit, item.expiry_date.strftime("%Y-%m-%d")
-            ), tags=(tag,))
-        else:
-            tree.insert("", "end", iid=item.id, values=(
-                item.id, item.name, item.quantity, item.unit, item.expiry_date.strftime("%Y-%m-%d")
-            ))
-    filter_inventory()
+
+    def refresh():
+        # Runs on the journal's writer thread, after the pending adds and deletes are written.
+        remove_stale_items()
+        get_store().reload()
+
+    def on_done(future):
+        if future.exception() is not None:
+            root.after(0, set_status, f"Failed to refresh the inventory: {future.exception()}")
+
+    journal.submit(refresh).add_done_callback(on_done)
+
+_render_pending = False
+
+def render_inventory():
+    """Rebuild the view model from the in-memory store and re-render the visible rows."""
+    global _render_pending
+    _render_pending = False
+    with metrics.timer("gui.render_inventory"):
+        store = get_store()
+        view_model.set_items(store.items_sorted_by_expiry())
+        inventory_table.render()
+        counts = expiry.count_buckets(store.expiry_columns().expiry_ordinals)
+        expiry_summary.config(text=f"Expired: {counts['expired']}   Today: {counts['today']}   "
+                                   f"Within {expiry.SOON_DAYS} days: {counts['soon']}")
+
+def on_inventory_changed(event, payload, version):
+    """Store subscriber; may run on the notification thread, so hop to the Tk thread and coalesce bursts."""
+    global _render_pending
+    if not _render_pending:
+        _render_pending = True
+        root.after(0, render_inventory)
 
 def delete_item():
     """Delete the selected item(s) from the inventory."""
-    selected = tree.selection()
+    selected = inventory_table.selection()
     if not selected:
         messagebox.showerror("Error", "Please select an item to delete.")
         return
-    for sel in selected:
-        item_id = int(sel)
-        rows_deleted = delete_inventory_item(item_id)
-        if rows_deleted:
-            tree.delete(sel)
-            messagebox.showinfo("Deleted", f"Item with ID {item_id} deleted.")
-        else:
-            messagebox.showerror("Error", f"Failed to delete item with ID {item_id}.")
+    item_ids = [int(sel) for sel in selected]
+    rows_deleted = journal.delete_items(item_ids)
+    inventory_table.selected.clear()
+    set_status(f"Deleted {rows_deleted} item(s). Press Ctrl+Z to undo.")
+
+def in_text_field(event):
+    """True when a shortcut was typed into an entry field, where it should not touch the inventory."""
+    return event is not None and isinstance(event.widget, (tk.Entry, ttk.Entry, tk.Text))
+
+def undo_last(event=None):
+    """Undo the most recent add or delete (bound to Ctrl+Z outside entry fields)."""
+    if in_text_field(event):
+        return None
+    command = journal.undo()
+    set_status(f"Undid: {command.describe()}." if command else "Nothing to undo.")
+    return "break"
+
+def redo_last(event=None):
+    """Redo the most recently undone add or delete (bound to Ctrl+Y outside entry fields)."""
+    if in_text_field(event):
+        return None
+    command = journal.redo()
+    set_status(f"Redid: {command.describe()}." if command else "Nothing to redo.")
+    return "break"
+
+def set_status(text):
+    """Show a short, non-blocking status message under the buttons."""
+    status_label.config(text=text)
+
+def on_close():
+    """Write pending changes to the database before exiting."""
+    journal.close()
+    root.destroy()
+
+SEARCH_DEBOUNCE_MS = 150
+_search_after_id = None
 
 def filter_inventory(*args):
-    """Filter inventory items based on the search query and auto-sort by expiry date."""
-    query = search_entry.get().strip().lower()
-    for i in tree.get_children():
-        tree.delete(i)
-    items = sorted(get_inventory_items(), key=lambda item: item.expiry_date)
-    today = datetime.now().date()
-    for item in items:
-        if query in item.name.lower():
-            expiry_date = item.expiry_date.date()
-            days_diff = (expiry_date - today).days
-            tag = ""
-            if days_diff < 0:
-                tag = "red"
-            elif days_diff == 0:
-                tag = "green"
-            elif 0 < days_diff <= 3:
-                tag = "yellow"
-            if tag:
-                tree.insert("", "end", iid=item.id, values=(
-                    item.id, item.name, item.quantity, item.unit, item.expiry_date.strftime("%Y-%m-%d")
-                ), tags=(tag,))
-            else:
-                tree.insert("", "end", iid=item.id, values=(
-                    item.id, item.name, item.quantity, item.unit, item.expiry_date.strftime("%Y-%m-%d")
-                ))
-
-def format_inventory_for_prompt():
-    """Return a formatted string listing each inventory item with name, quantity (with unit), and expiry date."""
-    items = get_inventory_items()
-    if not items:
-        return "No items in inventory."
-    lines = []
-    for item in items:
-        lines.append(f"{item.name} ({item.quantity}{item.unit}) expires on {item.expiry_date.strftime('%Y-%m-%d')}")
-    return "\n".join(lines)
-
-def suggest_recipes(api_key, additional_requests=""):
-    inventory_text = format_inventory_for_prompt()
-    prompt_text = (
-     "Based on the following inventory data, suggest recipes that will prioritize items near expiry " +
-        "to reduce food waste and use as much of the available inventory as possible. It is fair to assume that basic things like water, salt, peper, oil are availalbe" +
-        "If an item is technically expired, note within the recipe that the recipe is valid only if the item is still good to eat. Note that the dates are in YYYY-MM-DD format." +
-        "For each recipe, provide a recipe name, ingredients list, and brief instructions.\n\n" +
-        "Inventory Data:\n" + inventory_text + 
-        "\n\nAdditional Requests:\n" + additional_requests
-    )
-    url = "https://openrouter.ai/api/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    data = {
-        "model": "google/gemma-3-12b-it:free",
-        "messages": [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": prompt_text}
-                ]
-            }
-        ]
-    }
-    # Debug: Print payload
-    print("Payload sent to OpenRouter:")
-    print(json.dumps(data, indent=2))
-    
-    response = requests.post(url, headers=headers, data=json.dumps(data))
-    print("Response status:", response.status_code)
-    print("Response body:", response.text)
-    
-    if response.status_code == 200:
-        result = response.json()
-        try:
-            suggestion = result["choices"][0]["message"]["content"].strip()
-        except (KeyError, IndexError):
-            suggestion = "Unexpected response format:\n" + json.dumps(result)
-        return suggestion
-    else:
-        return f"Error {response.status_code}: {response.text}"
+    """Apply the search query to the loaded items and re-render only if the matches changed."""
+    global _search_after_id
+    _search_after_id = None
+    with metrics.timer("gui.filter_inventory"):
+        if view_model.set_query(search_entry.get()):
+            inventory_table.top = 0
+            inventory_table.render()
+
+def schedule_filter_inventory(event=None):
+    """Debounce search keystrokes so filtering runs once typing pauses."""
+    global _search_after_id
+    if _search_after_id is not None:
+        root.after_cancel(_search_after_id)
+    _search_after_id = root.after(SEARCH_DEBOUNCE_MS, filter_inventory)
+
+OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY")
+_recipe_client = None
+
+def get_recipe_client():
+    """Return the shared RecipeClient, creating it on first use."""
+    global _recipe_client
+    if _recipe_client is None:
+        _recipe_client = RecipeClient(OPENROUTER_API_KEY)
+    return _recipe_client
+
+STREAM_FLUSH_MS = 50    # How often streamed chunks are flushed into the Text widget
 
 def on_suggest_recipes():
-    """Handler for the 'Suggest Recipes' button; disable it while waiting for the API response, then display suggestions."""
-    api_key = "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"
+    """Handler for the 'Suggest Recipes' button; stream the suggestions into a result window as they are generated."""
+    if not OPENROUTER_API_KEY:
+        messagebox.showerror("Error", "Recipe suggestions need an OpenRouter API key. "
+                             "Set the OPENROUTER_API_KEY environment variable and restart the app.")
+        return
     additional = additional_entry.get().strip()
     # Update the button state and text to inform the user
     btn_recipes.config(text="Please wait...", state="disabled")
-    
-    def worker():
-        suggestion = suggest_recipes(api_key, additional)
-        # Once suggestion is received, update the GUI in the main thread
-        root.after(0, finish_recipe_suggestion, suggestion)
-    
-    def finish_recipe_suggestion(suggestion):
-        # Restore the button text and state
-        btn_recipes.config(text="Suggest Recipes", state="normal")
-        # Display the recipe suggestions in a new window
-        result_window = tk.Toplevel(root)
-        result_window.title("Recipe Suggestions")
-        result_window.geometry("600x400")
-        text_widget = tk.Text(result_window, wrap="word", font=("Helvetica", 10))
-        text_widget.insert("1.0", suggestion)
-        text_widget.configure(state="disabled")
-        text_widget.pack(expand=True, fill="both")
-    
-    threading.Thread(target=worker, daemon=True).start()
+    cancel_event = CancelEvent()   # Stop also closes the connection, so the worker exits at once
+    chunks = queue.Queue()
+
+    # Open the result window right away; text is appended as chunks arrive
+    result_window = tk.Toplevel(root)
+    result_window.title("Recipe Suggestions")
+    result_window.geometry("600x400")
+    btn_stop = tk.Button(result_window, text="Stop", font=("Helvetica", 10), command=cancel_event.set)
+    btn_stop.pack(side="bottom", pady=5)
+    text_widget = tk.Text(result_window, wrap="word", font=("Helvetica", 10))
+    text_widget.insert("1.0", "Please wait...")
+    text_widget.configure(state="disabled")
+    text_widget.pack(expand=True, fill="both")
+    state = {"started": False, "done": False}
+
+    def on_close():
+        cancel_event.set()
+        result_window.destroy()
+    result_window.protocol("WM_DELETE_WINDOW", on_close)
+
+    def on_done(future):
+        # Runs on the client's worker thread
+        try:
+            future.result()
+        except Exception as e:
+            chunks.put(f"\n\nError: {e}")
+        state["done"] = True
+
+    def flush_chunks():
+        # Batch every chunk received since the last flush into a single Text update
+        parts = []
+        while True:
+            try:
+                parts.append(chunks.get_nowait())
+            except queue.Empty:
+                break
+        alive = result_window.winfo_exists()
+        if parts and alive:
+            text_widget.configure(state="normal")
+            if not state["started"]:
+                text_widget.delete("1.0", tk.END)
+                state["started"] = True
+            text_widget.insert(tk.END, "".join(parts))
+            text_widget.see(tk.END)
+            text_widget.configure(state="disabled")
+        if state["done"] and chunks.empty():
+            # Restore the button text and state
+            btn_recipes.config(text="Suggest Recipes", state="normal")
+            if alive:
+                btn_stop.config(state="disabled")
+            return
+        root.after(STREAM_FLUSH_MS, flush_chunks)
+
+    future = get_recipe_client().stream_async(format_inventory_for_prompt(), additional, chunks.put, cancel_event)
+    future.add_done_callback(on_done)
+    root.after(STREAM_FLUSH_MS, flush_chunks)
 
 def run_notifications():
-    """Run the notification scheduler with an immediate check after a 5-second delay."""
-    import time
-    time.sleep(5)
-    from notification_service import check_and_notify, start_notification_scheduler
-    check_and_notify()
-    start_notification_scheduler(interval_minutes=5)
+    """Start the expiry scheduler (which runs an immediate check) after a 5-second delay."""
+    from notification_service import start_notification_scheduler
+    start_notification_scheduler()
+
+_pending_alerts = queue.Queue()
+_alerts_scheduled = False
+notification_window = None
+notification_text = None
 
 def gui_notification(message):
-    """Display a unified notification pop-up in the GUI."""
-    root.after(0, lambda: messagebox.showinfo("Notification", message))
-
-def treeview_sort_column(tv, col, reverse):
-    """Sort Treeview contents when a column header is clicked."""
-    data_list = []
-    for item in tv.get_children(''):
-        value = tv.set(item, col)
-        if col in ["id", "quantity"]:
-            try:
-                value = int(value)
-            except ValueError:
-                value = 0
-        elif col == "expiry_date":
-            try:
-                value = datetime.strptime(value, "%Y-%m-%d")
-            except ValueError:
-                value = datetime.min
-        data_list.append((value, item))
-    data_list.sort(key=lambda t: t[0], reverse=reverse)
-    for index, (val, item) in enumerate(data_list):
-        tv.move(item, '', index)
-    tv.heading(col, command=lambda: treeview_sort_column(tv, col, not reverse))
+    """Notification callback; may run on the scheduler thread, so queue the alert and coalesce bursts into one GUI update."""
+    global _alerts_scheduled
+    _pending_alerts.put(message)
+    if not _alerts_scheduled:
+        _alerts_scheduled = True
+        root.after(0, show_notifications)
+
+def show_notifications():
+    """Append every queued alert to the single Notifications window instead of opening a pop-up per alert."""
+    global _alerts_scheduled, notification_window, notification_text
+    _alerts_scheduled = False
+    messages = []
+    while True:
+        try:
+            messages.append(_pending_alerts.get_nowait())
+        except queue.Empty:
+            break
+    if not messages:
+        return
+    if notification_window is None or not notification_window.winfo_exists():
+        notification_window = tk.Toplevel(root)
+        notification_window.title("Notifications")
+        notification_window.geometry("450x250")
+        tk.Button(notification_window, text="Clear", font=("Helvetica", 10),
+                  command=lambda: notification_text.delete("1.0", tk.END)).pack(side="bottom", pady=5)
+        notification_text = tk.Text(notification_window, wrap="word", font=("Helvetica", 10))
+        notification_text.pack(expand=True, fill="both")
+    stamp = datetime.now().strftime("%Y-%m-%d %H:%M")
+    notification_text.insert(tk.END, f"[{stamp}]\n" + "\n".join(messages) + "\n\n")
+    notification_text.see(tk.END)
+    notification_window.deiconify()
+    notification_window.lift()
+
+def sort_inventory_column(col):
+    """Sort the inventory by a column when its header is clicked; clicking again reverses the order."""
+    with metrics.timer("gui.sort_inventory"):
+        view_model.sort_by(col)
+        inventory_table.render()
+
+METRICS_DUMP_FILE = os.environ.get("INVENTORY_METRICS_DUMP", "metrics.json")
+
+def dump_metrics(event=None):
+    """Write a JSON snapshot of the collected metrics (bound to Ctrl+Shift+M)."""
+    try:
+        path = metrics.dump(METRICS_DUMP_FILE)
+    except OSError as e:
+        messagebox.showerror("Error", f"Failed to write metrics: {e}")
+        return
+    messagebox.showinfo("Metrics", f"Metrics written to {os.path.abspath(path)}")
 
 # -----------------------
 # GUI Setup
 # -----------------------
 
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+metrics.install_from_env()
+
 root = tk.Tk()
 root.title("Smart Household Inventory Management System")
 
@@ -331,48 +436,72 @@ entry_expiry.set_date(default_date)
 # Buttons for actions
 btn_add = tk.Button(frame_buttons, text="Add Item", command=add_item, font=("Helvetica", 10))
 btn_add.grid(row=0, column=0, padx=5, pady=5)
+btn_use = tk.Button(frame_buttons, text="Use Item", command=use_item, font=("Helvetica", 10))
+btn_use.grid(row=0, column=1, padx=5, pady=5)
 btn_refresh = tk.Button(frame_buttons, text="Refresh Inventory", command=refresh_inventory, font=("Helvetica", 10))
-btn_refresh.grid(row=0, column=1, padx=5, pady=5)
+btn_refresh.grid(row=0, column=2, padx=5, pady=5)
 btn_delete = tk.Button(frame_buttons, text="Delete Selected", command=delete_item, font=("Helvetica", 10))
-btn_delete.grid(row=0, column=2, padx=5, pady=5)
+btn_delete.grid(row=0, column=3, padx=5, pady=5)
 btn_recipes = tk.Button(frame_buttons, text="Suggest Recipes", command=on_suggest_recipes, font=("Helvetica", 10))
-btn_recipes.grid(row=0, column=3, padx=5, pady=5)
+btn_recipes.grid(row=0, column=4, padx=5, pady=5)
+btn_undo = tk.Button(frame_buttons, text="Undo", command=undo_last, font=("Helvetica", 10))
+btn_undo.grid(row=0, column=5, padx=5, pady=5)
+btn_redo = tk.Button(frame_buttons, text="Redo", command=redo_last, font=("Helvetica", 10))
+btn_redo.grid(row=0, column=6, padx=5, pady=5)
 # Create a subframe in frame_buttons for additional requests
 frame_additional = tk.Frame(frame_buttons)
-frame_additional.grid(row=0, column=4, padx=5, pady=5, sticky="n")
+frame_additional.grid(row=0, column=7, padx=5, pady=5, sticky="n")
 # Place a label above the text box inside the subframe.
 tk.Label(frame_additional, text="Additional information for the suggestions:", font=("Helvetica", 10)).pack()
 # Create the entry widget for additional requests inside the subframe.
 additional_entry = tk.Entry(frame_additional, font=("Helvetica", 10), width=30)
 additional_entry.pack()
+# Result of the last add/delete/undo/redo
+status_label = tk.Label(frame_buttons, font=("Helvetica", 10), anchor="w")
+status_label.grid(row=1, column=0, columnspan=8, padx=5, sticky="w")
 
 # Search bar to filter inventory items
 tk.Label(frame_search, text="Search:", font=("Helvetica", 10)).pack(side="left", padx=5)
 search_entry = tk.Entry(frame_search, font=("Helvetica", 10))
 search_entry.pack(side="left", padx=5)
-search_entry.bind("<KeyRelease>", filter_inventory)
-
-# Treeview widget for inventory items with sortable columns
-columns = ("id", "name", "quantity", "unit", "expiry_date")
-tree = ttk.Treeview(frame_table, columns=columns, show="headings", selectmode="browse")
-tree.heading("id", text="ID", command=lambda: treeview_sort_column(tree, "id", False))
-tree.heading("name", text="Name", command=lambda: treeview_sort_column(tree, "name", False))
-tree.heading("quantity", text="Quantity", command=lambda: treeview_sort_column(tree, "quantity", False))
-tree.heading("unit", text="Unit", command=lambda: treeview_sort_column(tree, "unit", False))
-tree.heading("expiry_date", text="Expiry Date", command=lambda: treeview_sort_column(tree, "expiry_date", False))
+search_entry.bind("<KeyRelease>", schedule_filter_inventory)
+# Item counts per expiry bucket, updated on every render
+expiry_summary = tk.Label(frame_search, font=("Helvetica", 10))
+expiry_summary.pack(side="right", padx=5)
+
+# Treeview widget for inventory items with sortable columns. Only the visible window of rows
+# is materialized; VirtualTreeview drives the scrollbar from the view model instead.
+tree = ttk.Treeview(frame_table, columns=COLUMNS, show="headings", selectmode="extended")
+tree.heading("id", text="ID", command=lambda: sort_inventory_column("id"))
+tree.heading("name", text="Name", command=lambda: sort_inventory_column("name"))
+tree.heading("quantity", text="Quantity", command=lambda: sort_inventory_column("quantity"))
+tree.heading("unit", text="Unit", command=lambda: sort_inventory_column("unit"))
+tree.heading("expiry_date", text="Expiry Date", command=lambda: sort_inventory_column("expiry_date"))
+tree_scrollbar = ttk.Scrollbar(frame_table, orient="vertical")
+tree_scrollbar.pack(side="right", fill="y")
 tree.pack(fill="both", expand=True)
+view_model = InventoryViewModel(search=lambda query: get_store().search_ids(query))
+inventory_table = VirtualTreeview(tree, tree_scrollbar, view_model, row_height=25)
 
 # Configure tag styles for colored rows
 for tag, cfg in tree_tag_configs.items():
     tree.tag_configure(tag, **cfg)
 
+root.bind_all("<Control-M>", dump_metrics)
+root.bind_all("<Control-z>", undo_last)
+root.bind_all("<Control-y>", redo_last)
+root.protocol("WM_DELETE_WINDOW", on_close)
+
+# Adds and deletes are applied in memory and written to the database in the background;
+# start() first replays anything a previous run left unwritten.
+journal = CommandJournal().start()
+get_store().subscribe(on_inventory_changed)
 refresh_inventory()
 
 # Import the notification_service module locally and set the notification callback
 import notification_service
 notification_service.set_notification_callback(gui_notification)
 
-notif_thread = threading.Thread(target=run_notifications, daemon=True)
-notif_thread.start()
+root.after(5000, run_notifications)
 
 root.mainloop()
\ No newline at end of file
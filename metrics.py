@@ -0,0 +1,349 @@
+"""
+Lightweight in-process metrics, tracing and profiling hooks.
+
+    import metrics
+    metrics.increment("cache.hit")
+    with metrics.timer("gui.render_inventory"):
+        ...
+    @metrics.timed("inventory_service.add_inventory_item")
+    def add_inventory_item(...): ...
+
+Counters and latency histograms live in one process-wide registry; snapshot() returns them as a
+JSON-ready dict and dump(path) writes it to a file. SQL statements are timed by the connection
+factory used by database.get_connection.
+
+Environment variables (read by install_from_env):
+    INVENTORY_METRICS=0             disable recording
+    INVENTORY_METRICS_DUMP=path     write a JSON snapshot to path at exit
+    INVENTORY_PROFILE=path.prof     run cProfile on the calling thread and write stats at exit
+    INVENTORY_PROFILE=sample        run the sampling profiler (all threads); top stacks go in the snapshot
+"""
+import atexit
+import cProfile
+import functools
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter as _StackCounter
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+enabled = os.environ.get("INVENTORY_METRICS", "1") != "0"
+
+# Recent samples kept per histogram for the percentiles; count/sum/min/max cover every sample.
+HISTOGRAM_WINDOW = 2048
+# SQL labels are the statement with whitespace collapsed, cut to this many characters.
+SQL_LABEL_CHARS = 80
+
+class Histogram:
+    """Latency distribution in seconds: exact count/sum/min/max plus percentiles over a recent window."""
+    __slots__ = ("count", "total", "min", "max", "_recent")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._recent = deque(maxlen=HISTOGRAM_WINDOW)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+        self._recent.append(seconds)
+
+    def summary(self):
+        """Return count, total and min/mean/p50/p90/p99/max in milliseconds."""
+        recent = sorted(self._recent)
+        def pick(fraction):
+            return round(recent[min(len(recent) - 1, int(len(recent) * fraction))] * 1000, 3) if recent else None
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "min_ms": round(self.min * 1000, 3) if self.min is not None else None,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else None,
+            "p50_ms": pick(0.50),
+            "p90_ms": pick(0.90),
+            "p99_ms": pick(0.99),
+            "max_ms": round(self.max * 1000, 3) if self.max is not None else None,
+        }
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_started_at = time.time()
+
+def increment(name, amount=1):
+    """Add amount to the named counter."""
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def observe(name, seconds):
+    """Record one duration (in seconds) in the named histogram."""
+    if not enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+class timer:
+    """Context manager recording the duration of its block in the named histogram."""
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, time.perf_counter() - self.started)
+        if exc_type is not None:
+            increment(f"{self.name}.errors")
+        return False
+
+def timed(name):
+    """
+    Decorator recording each call's duration in the named histogram.
+    For generator functions only the time spent producing items is recorded (once the
+    generator finishes or is closed), not the time the consumer spends between items.
+    """
+    def decorate(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                if not enabled:
+                    yield from func(*args, **kwargs)
+                    return
+                perf_counter = time.perf_counter
+                started = perf_counter()
+                generator = func(*args, **kwargs)
+                elapsed = 0.0
+                try:
+                    while True:
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            break
+                        now = perf_counter()
+                        elapsed += now - started
+                        yield item
+                        started = perf_counter()
+                    elapsed += perf_counter() - started
+                finally:
+                    generator.close()
+                    observe(name, elapsed)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def sql_label(sql):
+    """Histogram name for a SQL statement: "sql:" plus the statement with whitespace collapsed."""
+    return "sql:" + " ".join(sql.split())[:SQL_LABEL_CHARS]
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that records execute/executemany durations per statement and fetch durations."""
+
+    def execute(self, sql, parameters=()):
+        if not enabled:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe(sql_label(sql), time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not enabled:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe(sql_label(sql), time.perf_counter() - started)
+
+    def fetchmany(self, size=None):
+        if not enabled:
+            return super().fetchmany(size if size is not None else self.arraysize)
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(size if size is not None else self.arraysize)
+        finally:
+            observe("sql.fetch", time.perf_counter() - started)
+
+    def fetchall(self):
+        if not enabled:
+            return super().fetchall()
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            observe("sql.fetch", time.perf_counter() - started)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection factory whose cursors (including conn.execute) are InstrumentedCursors."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+# -- Profiling -------------------------------------------------------------
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread each `interval` seconds from a background thread and
+    counts the innermost `depth` frames, so hot paths show up without cProfile's overhead.
+    """
+
+    def __init__(self, interval=0.005, depth=4):
+        self.interval = interval
+        self.depth = depth
+        self.samples = 0
+        self._stacks = _StackCounter()
+        self._lock = threading.Lock()   # Guards _stacks between the sampler thread and top()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def top(self, limit=20):
+        """Return the most frequent stacks as dicts with the stack (innermost first), samples and share."""
+        with self._lock:
+            total = sum(self._stacks.values()) or 1
+            common = self._stacks.most_common(limit)
+        return [
+            {"stack": list(stack), "samples": count, "share": round(count / total, 4)}
+            for stack, count in common
+        ]
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stacks.append(tuple(stack))
+            with self._lock:
+                self._stacks.update(stacks)
+            self.samples += 1
+
+_profiler = None        # Active cProfile.Profile or SamplingProfiler
+_profile_path = None
+
+def start_profiling(mode="sample", path=None):
+    """
+    Start profiling: mode "cprofile" profiles the calling thread and writes pstats to path when
+    stopped; mode "sample" samples every thread (results appear in snapshot()["profile"]).
+    """
+    global _profiler, _profile_path
+    stop_profiling()
+    if mode == "cprofile":
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+        _profile_path = path or "inventory.prof"
+    elif mode == "sample":
+        _profiler = SamplingProfiler().start()
+    else:
+        raise ValueError(f"Unknown profiling mode: {mode}")
+
+def stop_profiling():
+    """Stop the active profiler; cProfile stats are written to their file. Sampled stacks are kept."""
+    global _profiler
+    if _profiler is None:
+        return
+    if isinstance(_profiler, cProfile.Profile):
+        _profiler.disable()
+        _profiler.dump_stats(_profile_path)
+        logger.info("Wrote profile to %s", _profile_path)
+        _profiler = None
+    else:
+        _profiler.stop()
+
+# -- Snapshots -------------------------------------------------------------
+
+def snapshot():
+    """Return every counter and histogram summary (and sampled stacks, if any) as a JSON-ready dict."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {name: histogram.summary() for name, histogram in _histograms.items()}
+    result = {
+        "started_at": _started_at,
+        "uptime_s": round(time.time() - _started_at, 3),
+        "counters": dict(sorted(counters.items())),
+        "histograms": dict(sorted(histograms.items())),
+    }
+    if isinstance(_profiler, SamplingProfiler):
+        result["profile"] = {"samples": _profiler.samples, "top": _profiler.top()}
+    return result
+
+def dump(path):
+    """Write snapshot() to path as JSON and return the path."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, indent=2)
+    logger.info("Wrote metrics snapshot to %s", path)
+    return path
+
+def reset():
+    """Forget every counter and histogram."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+def install_from_env():
+    """Apply INVENTORY_PROFILE and INVENTORY_METRICS_DUMP (see the module docstring)."""
+    profile = os.environ.get("INVENTORY_PROFILE")
+    if profile:
+        if profile == "sample":
+            start_profiling("sample")
+        else:
+            start_profiling("cprofile", profile)
+    dump_path = os.environ.get("INVENTORY_METRICS_DUMP")
+    def at_exit():
+        if dump_path:
+            dump(dump_path)
+        stop_profiling()
+    if profile or dump_path:
+        atexit.register(at_exit)
@@ -1,25 +1,172 @@
-from dataclasses import dataclass
-from datetime import datetime
+from array import array
+from datetime import date, datetime
 from typing import Optional
 
-@dataclass
+def parse_expiry_ordinal(value):
+    """Convert an expiry value (ISO string, date, datetime or ordinal int) to a proleptic Gregorian ordinal."""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        # date.fromisoformat is implemented in C and much faster than strptime.
+        return date.fromisoformat(value[:10]).toordinal()
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    raise TypeError(f"Unsupported expiry date value: {value!r}")
+
 class InventoryItem:
-    id: Optional[int]      # Assigned by the database
-    name: str
-    quantity: int
-    unit: str              # New field: "g" for grams or "pcs" for pieces
-    expiry_date: datetime
+    """
+    A single inventory row.
+    The expiry date is kept as given (usually the ISO string from the database) and only
+    parsed into an ordinal the first time it is needed; __slots__ avoids a per-instance __dict__.
+    """
+    __slots__ = ("id", "name", "quantity", "unit", "_expiry")
+
+    def __init__(self, id: Optional[int], name: str, quantity: int, unit: str, expiry_date):
+        self.id = id                # Assigned by the database
+        self.name = name
+        self.quantity = quantity
+        self.unit = unit            # "g" for grams or "pcs" for pieces
+        self._expiry = expiry_date  # ISO string, date, datetime or ordinal int until first parsed
+
+    @property
+    def expiry_ordinal(self) -> int:
+        """Expiry date as a date ordinal (days since 0001-01-01), parsed lazily."""
+        expiry = self._expiry
+        if type(expiry) is not int:
+            expiry = self._expiry = parse_expiry_ordinal(expiry)
+        return expiry
+
+    @property
+    def expiry_date(self) -> datetime:
+        """Expiry date as a midnight datetime, for compatibility with existing callers."""
+        return datetime.fromordinal(self.expiry_ordinal)
+
+    @expiry_date.setter
+    def expiry_date(self, value):
+        self._expiry = value
 
-    def __post_init__(self):
-        # Convert expiry_date from string to datetime if needed
-        if isinstance(self.expiry_date, str):
-            self.expiry_date = datetime.strptime(self.expiry_date, "%Y-%m-%d")
+    @property
+    def expiry_iso(self) -> str:
+        """Expiry date as YYYY-MM-DD, without parsing when the raw database string is still held."""
+        expiry = self._expiry
+        if isinstance(expiry, str) and len(expiry) == 10:
+            return expiry
+        return date.fromordinal(self.expiry_ordinal).isoformat()
+
+    def __eq__(self, other):
+        if not isinstance(other, InventoryItem):
+            return NotImplemented
+        return (self.id, self.name, self.quantity, self.unit, self.expiry_ordinal) == \
+            (other.id, other.name, other.quantity, other.unit, other.expiry_ordinal)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"InventoryItem(id={self.id!r}, name={self.name!r}, quantity={self.quantity!r}, "
+                f"unit={self.unit!r}, expiry_date={self.expiry_iso!r})")
 
     def to_dict(self):
-        """Helper method to convert the dataclass to a dictionary format."""
+        """Helper method to convert the item to a dictionary format."""
         return {
             "id": self.id,
             "name": self.name,
             "quantity": self.quantity,
-            "expiry_date": self.expiry_date.strftime("%Y-%m-%d")
+            "unit": self.unit,
+            "expiry_date": self.expiry_iso
         }
+
+def item_from_dict(data):
+    """
+    Build an InventoryItem from a JSON-style mapping, validating every field.
+    Raises ValueError with a readable message when a field is missing or malformed.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Item must be an object.")
+    name = data.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("name must be a non-empty string.")
+    quantity = data.get("quantity")
+    if isinstance(quantity, bool) or not isinstance(quantity, int):
+        raise ValueError("quantity must be an integer.")
+    unit = data.get("unit")
+    if not isinstance(unit, str) or not unit.strip():
+        raise ValueError("unit must be a non-empty string.")
+    expiry = data.get("expiry_date")
+    if not isinstance(expiry, str):
+        raise ValueError("expiry_date must be a YYYY-MM-DD string.")
+    try:
+        expiry_ordinal = date.fromisoformat(expiry).toordinal()
+    except ValueError:
+        raise ValueError("expiry_date must be a YYYY-MM-DD string.") from None
+    item_id = data.get("id")
+    if item_id is not None and (isinstance(item_id, bool) or not isinstance(item_id, int)):
+        raise ValueError("id must be an integer.")
+    return InventoryItem(id=item_id, name=name.strip(), quantity=quantity, unit=unit.strip(), expiry_date=expiry_ordinal)
+
+class ItemBatch:
+    """
+    Columnar container for many inventory rows.
+    IDs, quantities and expiry ordinals live in typed arrays (8/8/4 bytes per row) and names/units
+    in plain lists, so bulk consumers avoid one Python object per row.
+    """
+    __slots__ = ("ids", "names", "quantities", "units", "expiry_ordinals")
+
+    def __init__(self):
+        self.ids = array("q")
+        self.names = []
+        self.quantities = array("q")
+        self.units = []
+        self.expiry_ordinals = array("i")
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a batch from (id, name, quantity, unit, expiry_date) tuples."""
+        batch = cls()
+        batch.extend_rows(rows)
+        return batch
+
+    @classmethod
+    def from_items(cls, items):
+        """Build a batch from InventoryItem objects."""
+        batch = cls()
+        for item in items:
+            batch.append(item.id, item.name, item.quantity, item.unit, item.expiry_ordinal)
+        return batch
+
+    def append(self, id, name, quantity, unit, expiry_date):
+        self.ids.append(-1 if id is None else id)
+        self.names.append(name)
+        self.quantities.append(quantity)
+        self.units.append(unit)
+        self.expiry_ordinals.append(parse_expiry_ordinal(expiry_date))
+
+    def extend_rows(self, rows):
+        """Append (id, name, quantity, unit, expiry_date) tuples."""
+        ids, names, quantities, units, ordinals = self.ids, self.names, self.quantities, self.units, self.expiry_ordinals
+        fromisoformat = date.fromisoformat
+        for row_id, name, quantity, unit, expiry in rows:
+            ids.append(row_id)
+            names.append(name)
+            quantities.append(quantity)
+            units.append(unit)
+            ordinals.append(fromisoformat(expiry).toordinal() if isinstance(expiry, str) else parse_expiry_ordinal(expiry))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        """Materialize a single row as an InventoryItem."""
+        row_id = self.ids[index]
+        return InventoryItem(
+            id=None if row_id == -1 else row_id,
+            name=self.names[index],
+            quantity=self.quantities[index],
+            unit=self.units[index],
+            expiry_date=self.expiry_ordinals[index],
+        )
+
+    def __iter__(self):
+        for index in range(len(self.ids)):
+            yield self[index]
@@ -1,71 +1,297 @@
+import heapq
+import logging
+import os
+import socket
+import threading
 import time
-import schedule
-from datetime import datetime
-from inventory_service import get_inventory_items, delete_inventory_item
+import uuid
+from datetime import date, datetime, timedelta
+import expiry
+import metrics
+from inventory_service import acquire_lease, claim_alerts, release_lease
+from inventory_store import get_store
+from notification_sinks import CallbackSink, SinkWorker
 
-# Global callback variable; if set, notifications are sent via this callback.
-notification_callback = None
+logger = logging.getLogger(__name__)
+
+# Days relative to an item's expiry date on which its notification changes (see check_and_notify).
+NOTIFY_OFFSETS_DAYS = tuple(range(-expiry.NOTIFY_DAYS, expiry.NOTIFY_DAYS + 1))
+# Items are purged once they are more than this many days past expiry.
+STALE_AFTER_DAYS = 7
+# Upper bound on a single sleep, so wall-clock jumps (suspend, DST) are noticed eventually.
+MAX_SLEEP_SECONDS = 3600
+# Only the process holding this lease sweeps; others retry after LEASE_RETRY_SECONDS.
+SWEEP_LEASE = "expiry-sweep"
+LEASE_SECONDS = 60
+LEASE_RETRY_SECONDS = 30
+# Identifies this process as a lease owner.
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Registered sinks by name. Each has its own bounded queue and worker thread (see SinkWorker).
+_sinks = {}
+_sinks_lock = threading.Lock()
+
+def register_sink(sink, **options):
+    """
+    Deliver notifications to sink from now on, replacing any sink registered under the same name.
+    options are passed to SinkWorker (maxsize, workers, policy, retries, backoff, block_timeout).
+    """
+    worker = SinkWorker(sink, **options)
+    with _sinks_lock:
+        previous = _sinks.pop(sink.name, None)
+        _sinks[sink.name] = worker
+    if previous is not None:
+        previous.close(timeout=5)
+    return worker
+
+def unregister_sink(name, timeout=5):
+    """Stop delivering to the named sink, after the messages already queued for it."""
+    with _sinks_lock:
+        worker = _sinks.pop(name, None)
+    if worker is not None:
+        worker.close(timeout)
+
+def close_sinks(timeout=5):
+    """Unregister every sink."""
+    with _sinks_lock:
+        names = list(_sinks)
+    for name in names:
+        unregister_sink(name, timeout)
+
+def get_sink_metrics():
+    """Return {sink name: metrics} for every registered sink."""
+    with _sinks_lock:
+        workers = dict(_sinks)
+    return {name: worker.metrics() for name, worker in workers.items()}
+
+def wait_for_delivery(timeout=None):
+    """Block until every queued notification has been delivered or given up on; False on timeout."""
+    with _sinks_lock:
+        workers = list(_sinks.values())
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for worker in workers:
+        if not worker.wait_idle(None if deadline is None else max(0.0, deadline - time.monotonic())):
+            return False
+    return True
 
 def set_notification_callback(callback):
-    global notification_callback
-    notification_callback = callback
+    """Send notifications to callback(message), e.g. the GUI; None removes it."""
+    if callback is None:
+        unregister_sink("callback")
+    else:
+        register_sink(CallbackSink(callback))
 
 def send_notification(message):
-    """Send a unified notification message via the callback or print it."""
-    if notification_callback:
-        notification_callback(message)
-    else:
-        print(f"[Notification] {message}")
+    """Queue a unified notification message for every registered sink, or print it if there are none."""
+    with _sinks_lock:
+        workers = list(_sinks.values())
+    if not workers:
+        logger.info("[Notification] %s", message)
+    for worker in workers:
+        worker.submit(message)
 
 def remove_stale_items():
     """
     Remove items whose expiry date is more than 7 days in the past.
     """
     today = datetime.now().date()
-    stale_ids = []
-    items = get_inventory_items()
-    for item in items:
-        expiry_date = item.expiry_date.date()
-        if (today - expiry_date).days > 7:
-            stale_ids.append(item.id)
-    for id in stale_ids:
-        delete_inventory_item(id)
+    get_store().purge_expired_before(today - timedelta(days=STALE_AFTER_DAYS))
 
-def check_and_notify():
+def build_expiry_alerts(today=None):
     """
-    Remove stale items and then check inventory for items nearing expiry.
-    Generates one unified notification message for all items within 2 days before
-    or 2 days after expiry.
+    Return (item_id, threshold, message) for every item within expiry.NOTIFY_DAYS days before or
+    after its expiry date, ordered by expiry date. threshold is the number of days past expiry.
     """
-    remove_stale_items()
-    
-    today = datetime.now().date()
-    messages = []
-    items = get_inventory_items()
-    for item in items:
-        expiry_date = item.expiry_date.date()
-        days_before = (expiry_date - today).days
-        days_after = (today - expiry_date).days
-        if -2 <= days_before <= 2:
+    today = today or datetime.now().date()
+    window = timedelta(days=expiry.NOTIFY_DAYS)
+    alerts = []
+    for item in get_store().items_expiring_between(today - window, today + window):
+        days_before = item.expiry_ordinal - today.toordinal()
+        days_after = -days_before
+        if expiry.in_notify_window(days_before):
             if days_before > 0:
-                messages.append(f"{item.name} ({item.quantity}{item.unit}) will expire in {days_before} day(s).")
+                message = f"{item.name} ({item.quantity}{item.unit}) will expire in {days_before} day(s)."
             elif days_before == 0:
-                messages.append(f"{item.name} ({item.quantity}{item.unit}) expires today!")
-            elif days_after > 0 and days_after < 2:
-                messages.append(f"{item.name} ({item.quantity}{item.unit}) expired {days_after} day(s) ago.")
-            elif days_after >= 2:
-                messages.append(f"{item.name} ({item.quantity}{item.unit}) has been spoiled!")
+                message = f"{item.name} ({item.quantity}{item.unit}) expires today!"
+            elif days_after > 0 and days_after < expiry.NOTIFY_DAYS:
+                message = f"{item.name} ({item.quantity}{item.unit}) expired {days_after} day(s) ago."
+            else:
+                message = f"{item.name} ({item.quantity}{item.unit}) has been spoiled!"
+            alerts.append((item.id, days_after, message))
+    return alerts
+
+def build_expiry_messages(today=None):
+    """Return the current expiry message for every item in the notify window, ordered by expiry date."""
+    return [message for _, _, message in build_expiry_alerts(today)]
+
+def _write_through_store(write, *args):
+    """
+    Run a lease or sent-alert write so the store knows it made it, instead of taking the
+    commit for an external change and reloading everything.
+    """
+    store = get_store()
+    token = store.begin_write()
+    try:
+        return write(*args)
+    finally:
+        store.mark_written(token)
+
+def collect_new_alerts(today=None):
+    """
+    Return the messages for alerts not yet sent by any process, recording them as sent.
+    Each item is reported once per threshold it crosses.
+    """
+    alerts = build_expiry_alerts(today)
+    keys = [(item_id, threshold) for item_id, threshold, _ in alerts]
+    claimed = _write_through_store(claim_alerts, keys) if keys else set()
+    return [message for item_id, threshold, message in alerts if (item_id, threshold) in claimed]
+
+def check_and_notify():
+    """
+    Remove stale items and send one unified notification for the expiry alerts not sent before.
+    Only one process sweeps at a time: returns False without doing anything if another
+    process holds the sweep lease.
+    """
+    if not _write_through_store(acquire_lease, SWEEP_LEASE, WORKER_ID, LEASE_SECONDS):
+        metrics.increment("notifications.lease_busy")
+        return False
+    try:
+        with metrics.timer("notifications.sweep"):
+            remove_stale_items()
+            messages = collect_new_alerts()
+    finally:
+        _write_through_store(release_lease, SWEEP_LEASE, WORKER_ID)
+    metrics.increment("notifications.alerts_sent", len(messages))
     if messages:
         unified_message = "\n".join(messages)
         send_notification(unified_message)
+    return True
+
+class ExpiryScheduler:
+    """
+    Runs check_and_notify exactly when some item crosses an expiry threshold.
+    A min-heap holds (due time, expiry ordinal) for the upcoming thresholds of each distinct
+    expiry date in the store: the days in NOTIFY_OFFSETS_DAYS around it, and the day its items
+    become stale. Items sharing an expiry date share its entries. The worker thread
+    sleeps on a condition variable until the earliest due time, and is woken early when the
+    store reports added, deleted or reloaded items. Nothing runs while nothing is due.
+    If on_due returns False (another process held the sweep lease) it is retried after
+    LEASE_RETRY_SECONDS.
+    """
+
+    def __init__(self, store=None, on_due=None, clock=datetime.now):
+        self.store = store or get_store()
+        self.on_due = on_due or check_and_notify
+        self.clock = clock
+        self._heap = []
+        self._scheduled = set()       # Expiry ordinals whose thresholds are in the heap
+        self._condition = threading.Condition()
+        self._pending_items = []      # Items added since the worker last looked
+        self._rebuild = True          # Rebuild the heap from the whole store
+        self._run_now = True          # Run on_due once at startup
+        self._retry_at = None         # When to retry a sweep that found the lease taken
+        self._stopped = False
+        self._thread = None
+        self._unsubscribe = None
+
+    def start(self):
+        """Subscribe to store changes and start the worker thread."""
+        self._unsubscribe = self.store.subscribe(self._on_store_changed)
+        self._thread = threading.Thread(target=self._run, name="expiry-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop the worker thread and wait for it to exit."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._unsubscribe:
+            self._unsubscribe()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def next_due(self):
+        """Return the earliest scheduled due time, or None."""
+        heap = self._heap
+        return heap[0][0] if heap else None
+
+    def _on_store_changed(self, event, payload, version):
+        with self._condition:
+            if event == "added":
+                self._pending_items.extend(payload)
+            elif event == "reloaded":
+                self._rebuild = True
+            # Deleted items are skipped lazily when their entries are popped.
+            self._condition.notify()
+
+    def _push_thresholds(self, ordinal, now):
+        """Schedule the future thresholds of an expiry date; return True if it is already inside the notify window."""
+        if ordinal not in self._scheduled:
+            self._scheduled.add(ordinal)
+            expiry_day = datetime.fromordinal(ordinal)
+            for offset in NOTIFY_OFFSETS_DAYS + (STALE_AFTER_DAYS + 1,):
+                due = expiry_day + timedelta(days=offset)
+                if due > now:
+                    heapq.heappush(self._heap, (due, ordinal))
+        return expiry.in_notify_window(ordinal - now.date().toordinal())
+
+    def _has_work(self):
+        return self._stopped or self._rebuild or self._run_now or bool(self._pending_items)
+
+    def _run(self):
+        # The heap is only touched by this thread. The condition guards the flags shared with
+        # store subscribers, and is never held while calling into the store (which has its own lock).
+        while True:
+            with self._condition:
+                if self._stopped:
+                    return
+                rebuild, self._rebuild = self._rebuild, False
+                pending, self._pending_items = self._pending_items, []
+                due, self._run_now = self._run_now, False
+            now = self.clock()
+            if rebuild:
+                self._heap = []
+                self._scheduled = set()
+                for ordinal in set(self.store.expiry_columns().expiry_ordinals):
+                    self._push_thresholds(ordinal, now)
+            for item in pending:
+                # A newly added item that is already near expiry is reported right away.
+                if self._push_thresholds(item.expiry_ordinal, now):
+                    due = True
+            while self._heap and self._heap[0][0] <= now:
+                _, ordinal = heapq.heappop(self._heap)
+                expiry_day = date.fromordinal(ordinal)
+                if self.store.items_expiring_between(expiry_day, expiry_day):
+                    due = True
+            if self._retry_at is not None and self._retry_at <= now:
+                self._retry_at = None
+                due = True
+            if due:
+                try:
+                    if self.on_due() is False:
+                        self._retry_at = now + timedelta(seconds=LEASE_RETRY_SECONDS)
+                except Exception as e:
+                    logger.exception("Error running expiry check: %s", e)
+                continue
+            timeout = MAX_SLEEP_SECONDS
+            if self._heap:
+                timeout = min(timeout, max(0.0, (self._heap[0][0] - now).total_seconds()))
+            if self._retry_at is not None:
+                timeout = min(timeout, max(0.0, (self._retry_at - now).total_seconds()))
+            with self._condition:
+                if not self._has_work():
+                    self._condition.wait(timeout)
 
-def start_notification_scheduler(interval_minutes=1440):
+def start_notification_scheduler():
     """
-    Start a scheduler to run the notification check every interval_minutes.
-    For testing, you might use a shorter interval (e.g. 1 minute).
+    Start the event-driven expiry scheduler in a background thread and return it.
+    It runs check_and_notify immediately and then only when an item crosses a threshold.
     """
-    schedule.every(interval_minutes).minutes.do(check_and_notify)
-    print("Notification scheduler started. Checking inventory regularly...")
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
\ No newline at end of file
+    scheduler = ExpiryScheduler().start()
+    logger.info("Notification scheduler started. Waiting for the next expiry threshold...")
+    return scheduler
@@ -0,0 +1,259 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import requests
+
+logger = logging.getLogger(__name__)
+
+# What SinkWorker.submit does when a sink's queue is full.
+DROP_OLDEST = "drop_oldest"     # Discard the oldest queued message to make room
+DROP_NEWEST = "drop_newest"     # Discard the message being submitted
+BLOCK = "block"                 # Wait up to block_timeout for room, then drop the new message
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+# Recent delivery latencies kept per sink for the percentile metrics.
+LATENCY_WINDOW = 1000
+
+class NotificationSink:
+    """
+    A destination for notification messages. Subclasses implement deliver(message), which
+    may block and should raise an exception when delivery fails so it can be retried.
+    """
+    name = "sink"
+
+    def deliver(self, message):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class CallbackSink(NotificationSink):
+    """Pass each message to a callable, e.g. the GUI's notification handler."""
+
+    def __init__(self, callback, name="callback"):
+        self.callback = callback
+        self.name = name
+
+    def deliver(self, message):
+        self.callback(message)
+
+class StreamSink(NotificationSink):
+    """Write timestamped messages to a text stream (stdout by default) or append them to a file."""
+
+    def __init__(self, path=None, stream=None, name=None):
+        self.path = path
+        self.name = name or (f"file:{path}" if path else "stdout")
+        self._stream = stream
+        self._owns_stream = False
+        self._lock = threading.Lock()
+
+    def deliver(self, message):
+        with self._lock:
+            if self._stream is None:
+                if self.path:
+                    self._stream = open(self.path, "a", encoding="utf-8")
+                    self._owns_stream = True
+                else:
+                    self._stream = sys.stdout
+            stamp = datetime.now().isoformat(timespec="seconds")
+            self._stream.write(f"[{stamp}] [Notification] {message}\n")
+            self._stream.flush()
+
+    def close(self):
+        with self._lock:
+            if self._owns_stream and self._stream is not None:
+                self._stream.close()
+            self._stream = None
+
+class WebhookSink(NotificationSink):
+    """POST each message as JSON ({"message": ..., "sent_at": ...}) to a URL; non-2xx responses count as failures."""
+
+    def __init__(self, url, timeout=(3, 10), headers=None, name=None):
+        self.url = url
+        self.timeout = timeout
+        self.name = name or f"webhook:{url}"
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json", **(headers or {})})
+
+    def deliver(self, message):
+        body = json.dumps({"message": message, "sent_at": datetime.now().isoformat(timespec="seconds")})
+        response = self.session.post(self.url, data=body, timeout=self.timeout)
+        response.raise_for_status()
+
+    def close(self):
+        self.session.close()
+
+def _remaining(deadline):
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+class SinkWorker:
+    """
+    Delivers messages to one sink from a bounded queue on its own worker thread(s), so a slow
+    sink never blocks the scheduler or other sinks. A full queue is handled by `policy` (see
+    DROP_POLICIES). Failed deliveries are retried up to `retries` times with exponential
+    backoff (backoff, 2*backoff, ...). metrics() reports counts, queue depth and latency.
+    """
+
+    def __init__(self, sink, maxsize=100, workers=1, policy=DROP_OLDEST, retries=3, backoff=0.5, block_timeout=1.0):
+        if policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {policy}")
+        self.sink = sink
+        self.policy = policy
+        self.retries = retries
+        self.backoff = backoff
+        self.block_timeout = block_timeout
+        self._queue = queue.Queue(maxsize)
+        self._stop = threading.Event()
+        self._idle = threading.Condition()
+        self._in_progress = 0       # Messages submitted and not yet delivered, dropped or failed
+        self._lock = threading.Lock()
+        self._counts = {"submitted": 0, "delivered": 0, "failed": 0, "dropped": 0, "retried": 0}
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._threads = [
+            threading.Thread(target=self._run, name=f"notify-{sink.name}-{index}", daemon=True)
+            for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, message):
+        """Queue message for delivery; returns False if it was dropped."""
+        self._count("submitted")
+        self._begin()
+        entry = (time.monotonic(), message)
+        try:
+            if self.policy == BLOCK:
+                self._queue.put(entry, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            pass
+        if self.policy == DROP_OLDEST:
+            while True:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                    self._count("dropped")
+                    self._finish()
+                except queue.Empty:
+                    pass
+                try:
+                    self._queue.put_nowait(entry)
+                    return True
+                except queue.Full:
+                    continue
+        self._count("dropped")
+        self._finish()
+        return False
+
+    def wait_idle(self, timeout=None):
+        """Block until every submitted message has been handled; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._in_progress:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        """
+        Stop the workers once the messages already queued are delivered (with their usual retries),
+        then close the sink. With a timeout, close() returns when it runs out: queued messages are
+        dropped if the queue is still full, and retries still in progress are abandoned. Without
+        one it waits for every queued message, so a sink whose deliver() never returns blocks it.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        sentinels = len(self._threads)
+        while sentinels:
+            try:
+                self._queue.put((None, None), timeout=_remaining(deadline))
+                sentinels -= 1
+            except queue.Full:
+                sentinels += self._drop_queued()
+        for thread in self._threads:
+            thread.join(_remaining(deadline))
+        # Out of time: workers still busy give up their current message instead of retrying it.
+        self._stop.set()
+        self.sink.close()
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            result = dict(self._counts)
+        result["queue_depth"] = self._queue.qsize()
+        result["policy"] = self.policy
+        if latencies:
+            result["latency_ms"] = {
+                "p50": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p99": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+                "max": round(latencies[-1] * 1000, 3),
+            }
+        return result
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def _begin(self):
+        with self._idle:
+            self._in_progress += 1
+
+    def _finish(self):
+        with self._idle:
+            self._in_progress -= 1
+            if not self._in_progress:
+                self._idle.notify_all()
+
+    def _drop_queued(self):
+        """Drop every queued message; returns how many stop sentinels were removed with them."""
+        sentinels = 0
+        while True:
+            try:
+                _, message = self._queue.get_nowait()
+            except queue.Empty:
+                return sentinels
+            self._queue.task_done()
+            if message is None:
+                sentinels += 1
+            else:
+                self._count("dropped")
+                self._finish()
+
+    def _run(self):
+        while True:
+            queued_at, message = self._queue.get()
+            try:
+                if message is None:
+                    return
+                self._deliver(queued_at, message)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, queued_at, message):
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    self.sink.deliver(message)
+                except Exception as e:
+                    if attempt == self.retries or self._stop.is_set():
+                        logger.error("Error delivering notification to %s: %s", self.sink.name, e)
+                        self._count("failed")
+                        return
+                    self._count("retried")
+                    # Sleep on the stop event, so a close() that ran out of time cuts the backoff short.
+                    self._stop.wait(self.backoff * (2 ** attempt))
+                    continue
+                with self._lock:
+                    self._counts["delivered"] += 1
+                    self._latencies.append(time.monotonic() - queued_at)
+                return
+        finally:
+            self._finish()
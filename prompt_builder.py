@@ -0,0 +1,102 @@
+import threading
+from datetime import date
+import expiry
+from inventory_store import get_store
+
+# Budget for the inventory section of the recipe prompt. Roughly four characters per token,
+# so the default keeps the inventory around 1500 tokens regardless of household size.
+DEFAULT_MAX_CHARS = 6000
+CHARS_PER_TOKEN = 4
+
+_memo_lock = threading.Lock()
+_memo = {"store": None, "key": None, "text": None}
+
+def aggregate_items(items):
+    """
+    Merge rows of the same ingredient (case-insensitive name) and unit.
+    Returns dicts with name, unit, quantity (summed), rows and earliest_expiry (ordinal),
+    ordered by earliest expiry, then name and unit, so near-expiry stock comes first.
+    """
+    groups = {}
+    for item in items:
+        key = (item.name.lower(), item.unit)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = {
+                "name": item.name,
+                "unit": item.unit,
+                "quantity": item.quantity,
+                "rows": 1,
+                "earliest_expiry": item.expiry_ordinal,
+            }
+            continue
+        group["quantity"] += item.quantity
+        group["rows"] += 1
+        if item.expiry_ordinal < group["earliest_expiry"]:
+            group["earliest_expiry"] = item.expiry_ordinal
+            group["name"] = item.name
+    return sorted(groups.values(), key=lambda g: (g["earliest_expiry"], g["name"].lower(), g["unit"]))
+
+def format_group(group, today_ordinal=None):
+    """Return the prompt line for one aggregated ingredient; expired and due-today stock is called out as such."""
+    status = expiry.FRESH if today_ordinal is None else expiry.bucket(group["earliest_expiry"] - today_ordinal)
+    if status == expiry.EXPIRED:
+        when = "expired on " + date.fromordinal(group["earliest_expiry"]).isoformat()
+    elif status == expiry.TODAY:
+        when = "expires today"
+    else:
+        when = "expires on " + date.fromordinal(group["earliest_expiry"]).isoformat()
+    if group["rows"] == 1:
+        return f"{group['name']} ({group['quantity']}{group['unit']}) {when}"
+    return f"{group['name']} ({group['quantity']}{group['unit']} across {group['rows']} packages) earliest {when}"
+
+def build_inventory_prompt(items, max_chars=DEFAULT_MAX_CHARS, today=None):
+    """
+    Return the inventory listing for the recipe prompt: aggregated per ingredient, nearest
+    expiry first, and cut to max_chars. Omitted ingredients are summarized in a final line.
+    """
+    today_ordinal = (today or date.today()).toordinal()
+    groups = aggregate_items(items)
+    if not groups:
+        return "No items in inventory."
+    lines = []
+    used = 0
+    for index, group in enumerate(groups):
+        line = format_group(group, today_ordinal)
+        remaining = len(groups) - index - 1
+        # Keep room for the summary line unless this is the last group.
+        reserve = 80 if remaining else 0
+        if lines and used + len(line) + 1 + reserve > max_chars:
+            break
+        lines.append(line)
+        used += len(line) + 1
+    omitted = groups[len(lines):]
+    if omitted:
+        first_expiry = date.fromordinal(omitted[0]["earliest_expiry"]).isoformat()
+        omitted_rows = sum(group["rows"] for group in omitted)
+        lines.append(f"...and {len(omitted)} more ingredients ({omitted_rows} items) expiring on or after {first_expiry}.")
+    return "\n".join(lines)
+
+def estimate_tokens(text):
+    """Rough token count for budget checks."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def format_inventory_for_prompt(max_chars=DEFAULT_MAX_CHARS, store=None):
+    """
+    Return the compacted inventory listing for the recipe prompt.
+    The result is memoized on the store's version and the date, so it is only rebuilt after
+    the inventory changes or the day rolls over.
+    """
+    store = store or get_store()
+    store.refresh_if_changed()
+    today = date.today()
+    key = (store.version, max_chars, today)
+    with _memo_lock:
+        if _memo["store"] is store and _memo["key"] == key:
+            return _memo["text"]
+    text = build_inventory_prompt(store.items_sorted_by_expiry(), max_chars, today)
+    with _memo_lock:
+        _memo["store"] = store
+        _memo["key"] = key
+        _memo["text"] = text
+    return text
@@ -0,0 +1,343 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Chat-completions endpoint; override with RECIPE_API_URL (e.g. to point at a local stub server).
+DEFAULT_ENDPOINT = os.environ.get("RECIPE_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+DEFAULT_MODEL = os.environ.get("RECIPE_MODEL", "google/gemma-3-12b-it:free")
+DEFAULT_CACHE_DIR = os.environ.get("RECIPE_CACHE_DIR", ".recipe_cache")
+# (connect, read) timeouts in seconds; generation can take a while, connecting should not.
+DEFAULT_TIMEOUT = (5, 120)
+
+def build_recipe_prompt(inventory_text, additional_requests=""):
+    """Return the recipe-suggestion prompt for an inventory listing."""
+    return (
+     "Based on the following inventory data, suggest recipes that will prioritize items near expiry " +
+        "to reduce food waste and use as much of the available inventory as possible. It is fair to assume that basic things like water, salt, peper, oil are availalbe" +
+        "If an item is technically expired, note within the recipe that the recipe is valid only if the item is still good to eat. Note that the dates are in YYYY-MM-DD format." +
+        "For each recipe, provide a recipe name, ingredients list, and brief instructions.\n\n" +
+        "Inventory Data:\n" + inventory_text +
+        "\n\nAdditional Requests:\n" + additional_requests
+    )
+
+def iter_sse_data(lines):
+    """
+    Yield the payload of each `data:` field from server-sent event lines, stopping at `[DONE]`.
+    Comments (lines starting with ":") and other fields are ignored.
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        if data:
+            yield data
+
+class CancelEvent(threading.Event):
+    """
+    threading.Event for cancelling stream_suggestions. set() also closes the HTTP response being
+    streamed, so a read blocked on a quiet connection returns immediately.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._response_lock = threading.Lock()
+        self._response = None
+
+    def attach(self, response):
+        """Register the response to close on cancel (closing it right away if already cancelled)."""
+        with self._response_lock:
+            self._response = response
+        if self.is_set():
+            response.close()
+
+    def detach(self):
+        with self._response_lock:
+            self._response = None
+
+    def set(self):
+        super().set()
+        with self._response_lock:
+            response = self._response
+        if response is not None:
+            response.close()
+
+class ResponseCache:
+    """
+    On-disk LRU cache of suggestion texts, one JSON file per key.
+    Recency is tracked by file modification time, so it survives restarts; once more than
+    max_entries are stored, the least recently used files are removed.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=64):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None    # OrderedDict of key -> path, least recently used first
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = OrderedDict()
+        if not os.path.isdir(self.directory):
+            return
+        paths = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".json"):
+                path = os.path.join(self.directory, filename)
+                try:
+                    paths.append((os.path.getmtime(path), filename[:-5], path))
+                except OSError:
+                    continue
+        for _, key, path in sorted(paths):
+            self._entries[key] = path
+
+    def get(self, key):
+        """Return the cached text for key, or None."""
+        with self._lock:
+            self._load()
+            path = self._entries.get(key)
+            if path is None:
+                return None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = json.load(f)["text"]
+                os.utime(path)
+            except (OSError, ValueError, KeyError):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return text
+
+    def put(self, key, text):
+        """Store text under key, evicting the least recently used entries if needed."""
+        with self._lock:
+            self._load()
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{key}.json")
+            tmp_path = f"{path}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"text": text, "stored_at": time.time()}, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.error("Error writing recipe cache: %s", e)
+                return
+            self._entries[key] = path
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                _, old_path = self._entries.popitem(last=False)
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self._lock:
+            self._load()
+            for path in self._entries.values():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._entries.clear()
+
+class RecipeClient:
+    """
+    Recipe-suggestion client for an OpenAI-style chat-completions endpoint.
+    Requests share one keep-alive requests.Session with retry/backoff on connection errors and
+    429/5xx responses. Successful suggestions are cached on disk keyed by a hash of
+    (inventory text, additional requests, model). Concurrent calls with the same key share a
+    single in-flight request.
+    """
+
+    def __init__(self, api_key, endpoint=DEFAULT_ENDPOINT, model=DEFAULT_MODEL, timeout=DEFAULT_TIMEOUT,
+                 retries=3, backoff_factor=0.5, cache=None, max_workers=2):
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.model = model
+        self.timeout = timeout
+        self.cache = cache if cache is not None else ResponseCache()
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"POST"}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recipe-client")
+        self._inflight = {}     # cache key -> Future
+        self._lock = threading.Lock()
+
+    def cache_key(self, inventory_text, additional_requests=""):
+        payload = json.dumps([inventory_text, additional_requests, self.model])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def build_payload(self, prompt_text):
+        return {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt_text}
+                    ]
+                }
+            ]
+        }
+
+    def headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    def suggest_async(self, inventory_text, additional_requests=""):
+        """Return a Future for the suggestion text; identical concurrent requests share one Future."""
+        key = self.cache_key(inventory_text, additional_requests)
+        cached = self.cache.get(key)
+        if cached is not None:
+            metrics.increment("recipe.cache_hits")
+            future = Future()
+            future.set_result(cached)
+            return future
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._fetch, key, inventory_text, additional_requests)
+                self._inflight[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+            return future
+
+    def suggest(self, inventory_text, additional_requests=""):
+        """Return the suggestion text (or an error description), blocking until it is available."""
+        return self.suggest_async(inventory_text, additional_requests).result()
+
+    def _forget(self, key):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    @metrics.timed("recipe.fetch")
+    def _fetch(self, key, inventory_text, additional_requests):
+        data = self.build_payload(build_recipe_prompt(inventory_text, additional_requests))
+        try:
+            response = self.session.post(self.endpoint, headers=self.headers(), data=json.dumps(data), timeout=self.timeout)
+        except requests.RequestException as e:
+            return f"Error: request failed: {e}"
+        if response.status_code != 200:
+            return f"Error {response.status_code}: {response.text}"
+        try:
+            result = response.json()
+        except ValueError:
+            return "Unexpected response format:\n" + response.text
+        try:
+            suggestion = result["choices"][0]["message"]["content"].strip()
+        except (KeyError, IndexError, TypeError, AttributeError):
+            return "Unexpected response format:\n" + json.dumps(result)
+        self.cache.put(key, suggestion)
+        return suggestion
+
+    def stream_suggestions(self, inventory_text, additional_requests="", cancel_event=None):
+        """
+        Yield the suggestion text in chunks as the model generates it (`stream: true` SSE).
+        Setting cancel_event stops the stream and closes the connection; pass a CancelEvent
+        so that also interrupts a read waiting for data. A cached suggestion is yielded as a
+        single chunk; a completed stream is added to the cache.
+        """
+        key = self.cache_key(inventory_text, additional_requests)
+        cached = self.cache.get(key)
+        if cached is not None:
+            metrics.increment("recipe.cache_hits")
+            yield cached
+            return
+        started = time.perf_counter()
+        data = self.build_payload(build_recipe_prompt(inventory_text, additional_requests))
+        data["stream"] = True
+        try:
+            response = self.session.post(self.endpoint, headers=self.headers(), data=json.dumps(data),
+                                         timeout=self.timeout, stream=True)
+        except requests.RequestException as e:
+            yield f"Error: request failed: {e}"
+            return
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        def raw_lines():
+            # Checked on every line, so keep-alive comments do not delay a cancel until the next data.
+            for line in response.iter_lines(chunk_size=None):
+                if cancelled():
+                    return
+                yield line
+
+        if isinstance(cancel_event, CancelEvent):
+            cancel_event.attach(response)
+        with response:
+            if response.status_code != 200:
+                yield f"Error {response.status_code}: {response.text}"
+                return
+            parts = []
+            try:
+                # Iterate over bytes: iter_sse_data decodes them as UTF-8, whereas decode_unicode would
+                # fall back to ISO-8859-1 for a text/event-stream without a charset.
+                for data_line in iter_sse_data(raw_lines()):
+                    if cancelled():
+                        return
+                    try:
+                        event = json.loads(data_line)
+                        chunk = event["choices"][0].get("delta", {}).get("content") or ""
+                    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                        continue
+                    if chunk:
+                        if not parts:
+                            metrics.observe("recipe.stream_first_chunk", time.perf_counter() - started)
+                        parts.append(chunk)
+                        yield chunk
+            except Exception as e:
+                # Closing the response on cancel makes the pending read fail; that is not an error.
+                if cancelled():
+                    return
+                if not isinstance(e, requests.RequestException):
+                    raise
+                yield f"\n\nError: stream interrupted: {e}"
+                return
+            finally:
+                if isinstance(cancel_event, CancelEvent):
+                    cancel_event.detach()
+        if parts and not cancelled():
+            metrics.observe("recipe.stream_total", time.perf_counter() - started)
+            self.cache.put(key, "".join(parts).strip())
+
+    def stream_async(self, inventory_text, additional_requests, on_chunk, cancel_event=None):
+        """
+        Consume stream_suggestions on the client's worker pool, calling on_chunk(text) for each
+        chunk. Returns a Future for the full text.
+        """
+        def run():
+            parts = []
+            for chunk in self.stream_suggestions(inventory_text, additional_requests, cancel_event):
+                parts.append(chunk)
+                on_chunk(chunk)
+            return "".join(parts)
+        return self._executor.submit(run)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
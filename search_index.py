@@ -0,0 +1,127 @@
+from bisect import bisect_left, insort
+from heapq import nsmallest
+
+class SearchIndex:
+    """
+    Case-insensitive substring search over short strings (ingredient or item names).
+    Each entry's lowercase key is broken into trigrams in an inverted index; queries of three
+    or more characters intersect the posting sets and verify the candidates. Shorter queries
+    fall back to a bisect over the sorted keys for prefix matches, then a scan of the
+    precomputed keys for the remaining substring matches. Results are ranked: whole-key
+    prefix, then word prefix, then any other substring; shorter keys first within a rank.
+    """
+
+    def __init__(self, gram_size=3):
+        self.gram_size = gram_size
+        self._keys = {}          # entry id -> lowercase key
+        self._postings = {}      # gram -> set of entry ids
+        self._sorted = []        # sorted (lowercase key, entry id) pairs
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._keys
+
+    def _grams(self, key):
+        size = self.gram_size
+        return {key[i:i + size] for i in range(len(key) - size + 1)}
+
+    def add(self, entry_id, text):
+        """Index text under entry_id, replacing any previous text for that id."""
+        if entry_id in self._keys:
+            self.remove(entry_id)
+        key = text.lower()
+        self._keys[entry_id] = key
+        for gram in self._grams(key):
+            self._postings.setdefault(gram, set()).add(entry_id)
+        insort(self._sorted, (key, entry_id))
+
+    def add_many(self, entries):
+        """Index (entry_id, text) pairs; faster than repeated add() for bulk loads."""
+        for entry_id, text in entries:
+            if entry_id in self._keys:
+                self.remove(entry_id)
+            key = text.lower()
+            self._keys[entry_id] = key
+            for gram in self._grams(key):
+                self._postings.setdefault(gram, set()).add(entry_id)
+            self._sorted.append((key, entry_id))
+        self._sorted.sort()
+
+    def remove(self, entry_id):
+        """Remove entry_id from the index (no-op if absent)."""
+        key = self._keys.pop(entry_id, None)
+        if key is None:
+            return
+        for gram in self._grams(key):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(entry_id)
+                if not ids:
+                    del self._postings[gram]
+        position = bisect_left(self._sorted, (key, entry_id))
+        if position < len(self._sorted) and self._sorted[position] == (key, entry_id):
+            del self._sorted[position]
+
+    def clear(self):
+        self._keys.clear()
+        self._postings.clear()
+        self._sorted.clear()
+
+    def search(self, query, limit=None):
+        """Return the ids of entries containing query, best matches first, at most limit of them."""
+        query = query.strip().lower()
+        if not query:
+            return []
+        if len(query) >= self.gram_size:
+            candidates = self._gram_candidates(query)
+        else:
+            candidates = self._short_candidates(query, limit)
+        keys = self._keys
+
+        def rank(entry_id):
+            key = keys[entry_id]
+            if key.startswith(query):
+                tier = 0
+            elif (" " + query) in key:
+                tier = 1
+            else:
+                tier = 2
+            return tier, len(key), key
+
+        if limit is None:
+            return sorted(candidates, key=rank)
+        return nsmallest(limit, candidates, key=rank)
+
+    def _gram_candidates(self, query):
+        postings = []
+        for gram in self._grams(query):
+            ids = self._postings.get(gram)
+            if not ids:
+                return []
+            postings.append(ids)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for ids in postings[1:]:
+            candidates &= ids
+            if not candidates:
+                return []
+        keys = self._keys
+        return [entry_id for entry_id in candidates if query in keys[entry_id]]
+
+    def _short_candidates(self, query, limit):
+        # Prefix matches are contiguous in the sorted keys.
+        matches = []
+        position = bisect_left(self._sorted, (query,))
+        sorted_keys = self._sorted
+        while position < len(sorted_keys) and sorted_keys[position][0].startswith(query):
+            matches.append(sorted_keys[position][1])
+            position += 1
+        if limit is not None and len(matches) >= limit:
+            return matches
+        # Non-prefix substring matches need a scan, but only over precomputed lowercase keys.
+        for entry_id, key in self._keys.items():
+            if query in key and not key.startswith(query):
+                matches.append(entry_id)
+        return matches
@@ -0,0 +1,354 @@
+"""
+Headless inventory service: a small asyncio HTTP/1.1 JSON API over the shared InventoryStore.
+
+    python server.py --host 127.0.0.1 --port 8080 [--db inventory.db] [--notify]
+                     [--notify-file alerts.log] [--notify-webhook http://127.0.0.1:9000/hook]
+
+Endpoints:
+    GET    /health
+    GET    /items?limit=50&offset=0&q=milk   paginated, ordered by expiry; supports ETag/If-None-Match
+    GET    /items/<id>
+    POST   /items                            one item object or a list of them
+    DELETE /items/<id>
+    DELETE /items                            body: {"ids": [1, 2, 3]}
+    GET    /expiry-report?weeks=8            the messages check_and_notify would send plus an expiry
+                                             summary per bucket, unit and week ahead; supports ETag
+    GET    /search?q=to&limit=10             ranked name search over inventory items
+    GET    /metrics                          counters, latency histograms and sink metrics (see metrics.py)
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+import database
+import expiry
+import metrics
+import notification_service
+from inventory_store import get_store
+from models import item_from_dict
+from notification_sinks import StreamSink, WebhookSink
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 4 * 1024 * 1024
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+KEEP_ALIVE_TIMEOUT = 15     # Seconds an idle keep-alive connection is held open
+MAX_CONCURRENT_WRITES = 4   # Writes run in worker threads; bound how many queue up there
+
+logger = logging.getLogger(__name__)
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def etag_matches(header, etag):
+    """
+    True if an If-None-Match header value matches etag: "*" or any entry of its comma-separated
+    list, compared weakly (a W/ prefix on either side is ignored) as RFC 9110 requires.
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+class Request:
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.keep_alive = False
+
+    def param(self, name, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+    def int_param(self, name, default, minimum=0, maximum=None):
+        value = self.param(name)
+        if value is None:
+            return default
+        try:
+            number = int(value)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer.") from None
+        if number < minimum:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be at least {minimum}.")
+        return min(number, maximum) if maximum is not None else number
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be valid JSON.") from None
+
+class Response:
+    def __init__(self, status=HTTPStatus.OK, payload=None, etag=None):
+        self.status = status
+        self.payload = payload
+        self.etag = etag
+
+class InventoryAPI:
+    """
+    Routes requests to InventoryStore operations. Reads are served from memory, but in worker
+    threads: the store lock is held for the whole of a write transaction and a check for
+    external changes may reload, so neither may stall the event loop.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or get_store()
+        self._write_slots = asyncio.Semaphore(MAX_CONCURRENT_WRITES)
+
+    def etag_for(self, request, extra=""):
+        """Weak validator derived from the store version and the request's path and query."""
+        digest = hashlib.sha1(f"{request.path}?{sorted(request.query.items())}{extra}".encode()).hexdigest()[:12]
+        return f'W/"{self.store.version}-{digest}"'
+
+    async def handle(self, request):
+        parts = [part for part in request.path.split("/") if part]
+        if request.method == "GET" and parts == ["health"]:
+            return Response(payload={"status": "ok", "version": self.store.version,
+                                     "notification_sinks": notification_service.get_sink_metrics()})
+        if parts == ["items"]:
+            if request.method == "GET":
+                return await asyncio.to_thread(self.list_items, request)
+            if request.method == "POST":
+                return await self.add_items(request)
+            if request.method == "DELETE":
+                return await self.delete_items(request)
+        if len(parts) == 2 and parts[0] == "items":
+            try:
+                item_id = int(parts[1])
+            except ValueError:
+                raise HTTPError(HTTPStatus.NOT_FOUND, "Not found.") from None
+            if request.method == "GET":
+                return await asyncio.to_thread(self.get_item, item_id)
+            if request.method == "DELETE":
+                return await self.delete_ids([item_id])
+        if request.method == "GET" and parts == ["expiry-report"]:
+            return await asyncio.to_thread(self.expiry_report, request)
+        if request.method == "GET" and parts == ["search"]:
+            return await asyncio.to_thread(self.search, request)
+        if request.method == "GET" and parts == ["metrics"]:
+            snapshot = metrics.snapshot()
+            snapshot["notification_sinks"] = notification_service.get_sink_metrics()
+            return Response(payload=snapshot)
+        raise HTTPError(HTTPStatus.NOT_FOUND, "Not found.")
+
+    def list_items(self, request):
+        self.store.refresh_if_changed()
+        etag = self.etag_for(request)
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(HTTPStatus.NOT_MODIFIED, etag=etag)
+        limit = request.int_param("limit", DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+        offset = request.int_param("offset", 0)
+        query = request.param("q", "").strip()
+        if query:
+            matching = set(self.store.search_ids(query))
+            items = [item for item in self.store.items_sorted_by_expiry() if item.id in matching]
+            total = len(items)
+            page = items[offset:offset + limit]
+        else:
+            total = len(self.store)
+            page = self.store.items_sorted_by_expiry(offset, limit)
+        payload = {
+            "items": [item.to_dict() for item in page],
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "version": self.store.version,
+        }
+        return Response(payload=payload, etag=etag)
+
+    def get_item(self, item_id):
+        item = self.store.get(item_id)
+        if item is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Item {item_id} not found.")
+        return Response(payload=item.to_dict())
+
+    async def add_items(self, request):
+        data = request.json()
+        records = data if isinstance(data, list) else [data]
+        if not records:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "No items given.")
+        items = []
+        for index, record in enumerate(records):
+            try:
+                items.append(item_from_dict(record))
+            except ValueError as e:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, f"Item {index}: {e}") from None
+            items[-1].id = None
+        async with self._write_slots:
+            ids = await asyncio.to_thread(self.store.add_items, items)
+        if not ids:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "Failed to add items.")
+        return Response(HTTPStatus.CREATED, {"ids": ids, "version": self.store.version})
+
+    async def delete_items(self, request):
+        data = request.json()
+        ids = data.get("ids") if isinstance(data, dict) else None
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Body must be {"ids": [<int>, ...]}.')
+        return await self.delete_ids(ids)
+
+    async def delete_ids(self, ids):
+        async with self._write_slots:
+            deleted = await asyncio.to_thread(self.store.delete_items, ids)
+        if deleted is None:
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "Failed to delete items.")
+        if not deleted and len(ids) == 1:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"Item {ids[0]} not found.")
+        return Response(payload={"deleted": deleted, "version": self.store.version})
+
+    def expiry_report(self, request):
+        self.store.refresh_if_changed()
+        today = datetime.now().date()
+        etag = self.etag_for(request, today.isoformat())
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(HTTPStatus.NOT_MODIFIED, etag=etag)
+        weeks = request.int_param("weeks", expiry.REPORT_WEEKS, minimum=1, maximum=104)
+        messages = notification_service.build_expiry_messages(today)
+        summary = expiry.report(self.store.expiry_columns(), today, weeks)
+        return Response(payload={"date": today.isoformat(), "messages": messages, "summary": summary}, etag=etag)
+
+    def search(self, request):
+        query = request.param("q", "")
+        limit = request.int_param("limit", 10, minimum=1, maximum=MAX_PAGE_SIZE)
+        items = [self.store.get(item_id) for item_id in self.store.search_ids(query, limit)]
+        return Response(payload={"items": [item.to_dict() for item in items if item is not None]})
+
+async def read_request(reader):
+    """Parse one HTTP/1.1 request from reader; returns None when the client closed the connection."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Incomplete request.") from None
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Headers too large.") from None
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line.") from None
+    headers = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.") from None
+    if length < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large.")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    request = Request(method.upper(), url.path, parse_qs(url.query), headers, body)
+    request.keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+    return request
+
+def encode_response(response, keep_alive):
+    status = HTTPStatus(response.status)
+    body = b""
+    if response.payload is not None and status != HTTPStatus.NOT_MODIFIED:
+        body = json.dumps(response.payload).encode("utf-8")
+    headers = [
+        f"HTTP/1.1 {status.value} {status.phrase}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    if body:
+        headers.append("Content-Type: application/json")
+    if response.etag:
+        headers.append(f"ETag: {response.etag}")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body
+
+async def handle_connection(api, reader, writer):
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await asyncio.wait_for(read_request(reader), KEEP_ALIVE_TIMEOUT)
+                if request is None:
+                    break
+                keep_alive = request.keep_alive
+                started = time.perf_counter()
+                response = await api.handle(request)
+                route = request.path.strip("/").split("/", 1)[0]
+                metrics.observe(f"http.{request.method} /{route}", time.perf_counter() - started)
+            except asyncio.TimeoutError:
+                break
+            except HTTPError as e:
+                response = Response(e.status, {"error": e.message})
+            except Exception as e:
+                logger.exception("Error handling request: %s", e)
+                response = Response(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error."})
+            writer.write(encode_response(response, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host="127.0.0.1", port=8080, notify=False):
+    store = get_store()
+    await asyncio.to_thread(store.reload)
+    api = InventoryAPI(store)
+    scheduler = notification_service.start_notification_scheduler() if notify else None
+    server = await asyncio.start_server(lambda r, w: handle_connection(api, r, w), host, port, limit=MAX_HEADER_BYTES)
+    logger.info("Inventory service listening on http://%s:%s", host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if scheduler is not None:
+            scheduler.stop(timeout=5)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the headless inventory HTTP/JSON service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", default=database.DB_FILE, help="SQLite database file")
+    parser.add_argument("--notify", action="store_true", help="Also run the expiry notification scheduler")
+    parser.add_argument("--notify-file", help="Append notifications to this file (default: stdout)")
+    parser.add_argument("--notify-webhook", help="Also POST notifications as JSON to this URL")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    metrics.install_from_env()
+    database.set_database_file(args.db)
+    if args.notify:
+        notification_service.register_sink(StreamSink(args.notify_file))
+        if args.notify_webhook:
+            notification_service.register_sink(WebhookSink(args.notify_webhook))
+    try:
+        asyncio.run(serve(args.host, args.port, args.notify))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        notification_service.close_sinks()
+
+if __name__ == "__main__":
+    main()